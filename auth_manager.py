@@ -1,11 +1,12 @@
 
 # auth_manager.py
 
-import requests
-from requests.auth import HTTPBasicAuth
+# `requests` é importado apenas dentro de get_access_token(): quando o token em cache
+# ainda é válido não pagamos o custo de carregar a stack HTTP no arranque.
 import time
 import json
 import os
+import metrics
 
 # --- 1. VARIÁVEL DE MÓDULO PARA ARMAZENAR O TOKEN ---
 # O token e o tempo de expiração serão armazenados aqui, acessíveis após a inicialização.
@@ -16,7 +17,8 @@ TOKEN_INFO = {
 
 # --- 2. CONFIGURAÇÕES (Substitua pelos seus valores) ---
 # O Access Token URL é {{api-bzd-identity}}
-TOKEN_URL = "https://arquivodigitalpp.bizdocs.mobi/identity/connect/token" 
+# Pode ser redefinido pela variável de ambiente API_BZD_IDENTITY (ex.: servidor mock local)
+TOKEN_URL = os.environ.get('API_BZD_IDENTITY', "https://arquivodigitalpp.bizdocs.mobi/identity/connect/token")
 # O Client ID é {{api-bzd-identity-client_id}}
 CLIENT_ID = "Trigenius" 
 # O Client Secret é {{api-bzd-identity-client_secret}}
@@ -39,10 +41,14 @@ def get_access_token():
     # Verifica se o token atual ainda é válido
     if TOKEN_INFO["access_token"] and (TOKEN_INFO["expiry_timestamp"] > time.time() + SAFETY_MARGIN):
         print("✅ Token existente ainda válido.")
+        metrics.record_event('token_cache_hit', endpoint='identity/connect/token')
         return TOKEN_INFO["access_token"]
 
     # Se o token estiver ausente ou prestes a expirar, solicita um novo
     print("⏳ A solicitar novo Access Token...")
+
+    import requests
+    from requests.auth import HTTPBasicAuth
     
     payload = {
         "grant_type": "password",
@@ -53,7 +59,8 @@ def get_access_token():
     auth = HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET)
 
     try:
-        response = requests.post(TOKEN_URL, data=payload, auth=auth)
+        response = metrics.instrumented_request('POST', TOKEN_URL, endpoint='identity/connect/token', vatid='',
+                                                data=payload, auth=auth)
         response.raise_for_status() 
         token_data = response.json()
         
@@ -63,6 +70,7 @@ def get_access_token():
         # Atualiza a variável de módulo (global dentro do ficheiro)
         TOKEN_INFO["access_token"] = token
         TOKEN_INFO["expiry_timestamp"] = time.time() + expires_in
+        metrics.record_event('token_refresh', endpoint='identity/connect/token')
         
         print(f"✅ Novo Access Token obtido. Válido por {expires_in} segundos.")
         return token
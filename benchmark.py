@@ -0,0 +1,251 @@
+"""Reproducible benchmark of the sync, export and metadata paths against `mock_server`.
+
+Each run starts a local mock server with the given configuration, points `main`
+and `auth_manager` at it and measures:
+
+- sync:     paginated Documents/InAccounting via `main.call_in_accounting`
+- export:   `main.export_in_accounting_csv` over the synced items (no network)
+- metadata: batched Documents/ExtractedMetadata via `main.call_extracted_metadata`
+
+For every path the result holds docs/sec, p50/p99 latency per operation (ms),
+error count and peak_alloc_kb: the peak Python heap allocated while that path
+ran (tracemalloc, restarted for each path, so a regression in one path is not
+hidden by an earlier one). process_peak_rss_kb is the process-wide RSS high-water
+mark so far and is only kept for reference. Results are written as JSON so two
+versions can be compared with --compare.
+
+Usage:
+  python benchmark.py --docs 5000 --page-size 200 --latency-ms 20
+  python benchmark.py --output benchmarks/v2.json --compare benchmarks/v1.json
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import contextlib
+import tracemalloc
+
+import main
+import auth_manager
+import metrics
+from mock_server import MockBizDocsServer
+
+PATHS = ('sync', 'export', 'metadata')
+
+
+def _peak_rss_kb():
+    """Peak resident set size of this process in KiB, or None where `resource` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _run_path(fn, *args, **kwargs):
+    """Run one benchmark path with allocation tracing; adds peak_alloc_kb to its summary."""
+    tracemalloc.start()
+    try:
+        summary = fn(*args, **kwargs)
+        summary['peak_alloc_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+    return summary
+
+
+def _summarise(latencies, docs, elapsed, errors):
+    return {
+        'docs': docs,
+        'operations': len(latencies),
+        'elapsed_s': round(elapsed, 4),
+        'docs_per_sec': round(docs / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': round(metrics.percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(metrics.percentile(latencies, 99) * 1000, 3),
+        'errors': errors,
+        'process_peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def _with_retries(fn, max_retries=5):
+    """Call fn() until it returns a non-error response. Returns (resp, errors) and honours Retry-After."""
+    errors = 0
+    while True:
+        resp = fn()
+        if resp.status_code < 400 or errors >= max_retries:
+            return resp, errors
+        errors += 1
+        retry_after = resp.headers.get('Retry-After')
+        time.sleep(min(float(retry_after), 5.0) if retry_after else 0.05)
+
+
+def bench_sync(vatid):
+    """Follow InAccounting pagination to the end; one operation per page."""
+    latencies, items, errors = [], [], 0
+    payload = {'documentStatus': ['accountvalidation', 'manualentry']}
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        resp, errs = _with_retries(lambda: main.call_in_accounting(vatid=vatid, payload=dict(payload)))
+        latencies.append(time.perf_counter() - t0)
+        errors += errs
+        if resp.status_code >= 400:
+            break
+        items.extend(main.IN_ACCOUNTING_ITEMS)
+        key = (main.IN_ACCOUNTING_RESPONSE or {}).get('paginationKey')
+        if not key:
+            break
+        payload['paginationKey'] = key
+    elapsed = time.perf_counter() - start
+    main.IN_ACCOUNTING_ITEMS = items
+    return _summarise(latencies, len(items), elapsed, errors)
+
+
+def bench_export(workdir, repeat=5):
+    """Export the synced items to CSV `repeat` times; one operation per export."""
+    latencies = []
+    path = os.path.join(workdir, 'in_accounting.csv')
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        main.export_in_accounting_csv(path)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return _summarise(latencies, len(main.IN_ACCOUNTING_ITEMS) * repeat, elapsed, 0)
+
+
+def bench_metadata(vatid, batch_size=50):
+    """Fetch ExtractedMetadata for every synced document in batches; one operation per batch."""
+    ids = [it.get('documentId') for it in main.IN_ACCOUNTING_ITEMS if it.get('documentId')]
+    latencies, docs, errors = [], 0, 0
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch_size):
+        main.DOCUMENT_IDS[:] = ids[i:i + batch_size]
+        t0 = time.perf_counter()
+        resp, errs = _with_retries(lambda: main.call_extracted_metadata(vatid=vatid))
+        latencies.append(time.perf_counter() - t0)
+        errors += errs
+        if resp.status_code < 400:
+            docs += len((resp.json() or {}).get('items') or [])
+    elapsed = time.perf_counter() - start
+    return _summarise(latencies, docs, elapsed, errors)
+
+
+def run_benchmark(docs=1000, page_size=100, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0,
+                  batch_size=50, export_repeat=5, vatid='PT504419811', paths=PATHS, label=None):
+    """Run the selected benchmark paths against a fresh mock server and return the result dict."""
+    server = MockBizDocsServer(docs=docs, page_size=page_size, latency_ms=latency_ms, jitter_ms=jitter_ms,
+                               error_rate=error_rate, rate_limit=rate_limit).start()
+    saved = (main.BASE_URL, main.IN_ACCOUNTING_JSON_PATH, auth_manager.TOKEN_URL, dict(auth_manager.TOKEN_INFO))
+    results = {}
+    metrics.reset()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            main.BASE_URL = server.api_url
+            main.IN_ACCOUNTING_JSON_PATH = os.path.join(workdir, 'in_accounting.json')
+            auth_manager.TOKEN_URL = server.token_url
+            auth_manager.TOKEN_INFO.update({'access_token': None, 'expiry_timestamp': 0})
+            # the call paths print progress messages; keep the benchmark output readable
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                # sync always runs: export and metadata work on the synced items
+                results['sync'] = _run_path(bench_sync, vatid)
+                if 'export' in paths:
+                    results['export'] = _run_path(bench_export, workdir, repeat=export_repeat)
+                if 'metadata' in paths:
+                    results['metadata'] = _run_path(bench_metadata, vatid, batch_size=batch_size)
+    finally:
+        main.BASE_URL, main.IN_ACCOUNTING_JSON_PATH, auth_manager.TOKEN_URL = saved[:3]
+        auth_manager.TOKEN_INFO.clear()
+        auth_manager.TOKEN_INFO.update(saved[3])
+        counters = server.counters
+        server.stop()
+
+    return {
+        'label': label,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'config': {
+            'docs': docs, 'page_size': page_size, 'latency_ms': latency_ms, 'jitter_ms': jitter_ms,
+            'error_rate': error_rate, 'rate_limit': rate_limit, 'batch_size': batch_size,
+            'export_repeat': export_repeat
+        },
+        'server': counters,
+        'results': results,
+        'endpoints': metrics.endpoint_summary(),
+    }
+
+
+def compare_results(current: dict, previous: dict):
+    """Return {path: {metric: (previous, current, pct_change)}} for the shared paths."""
+    out = {}
+    for path, cur in current.get('results', {}).items():
+        prev = previous.get('results', {}).get(path)
+        if not prev:
+            continue
+        out[path] = {}
+        for metric in ('docs_per_sec', 'p50_ms', 'p99_ms', 'peak_alloc_kb'):
+            a, b = prev.get(metric), cur.get(metric)
+            pct = round((b - a) / a * 100, 1) if a and b is not None else None
+            out[path][metric] = (a, b, pct)
+    return out
+
+
+def print_results(result: dict, comparison: dict = None):
+    print(f"{'path':<10} {'docs':>7} {'docs/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>6} {'alloc KiB':>9}")
+    for path, r in result['results'].items():
+        print(f"{path:<10} {r['docs']:>7} {r['docs_per_sec']:>10.1f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['errors']:>6} {str(r.get('peak_alloc_kb')):>9}")
+    if comparison:
+        print('\nChange vs previous run:')
+        for path, metrics in comparison.items():
+            parts = [f"{m} {pct:+.1f}%" for m, (_, _, pct) in metrics.items() if pct is not None]
+            print(f"  {path}: {', '.join(parts)}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark sync/export/metadata paths against a local mock server')
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=50, help='ExtractedMetadata ids per request')
+    parser.add_argument('--paths', default=','.join(PATHS), help='Comma-separated subset of sync,export,metadata')
+    parser.add_argument('--label', help='Free text stored with the results (e.g. version)')
+    parser.add_argument('--output', help='JSON results path (default benchmarks/bench_<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous results JSON to compare against')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON (for VFP)')
+    args = parser.parse_args()
+
+    paths = tuple(p.strip() for p in args.paths.split(',') if p.strip())
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+
+    result = run_benchmark(docs=args.docs, page_size=args.page_size, latency_ms=args.latency_ms,
+                           jitter_ms=args.jitter_ms, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                           batch_size=args.batch_size, paths=paths, label=args.label)
+
+    output = args.output or os.path.join('benchmarks', f'bench_{int(time.time())}.json')
+    out_dir = os.path.dirname(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as fh:
+        json.dump(result, fh, ensure_ascii=False, indent=2)
+
+    comparison = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            comparison = compare_results(result, json.load(fh))
+
+    if args.machine_json:
+        print(json.dumps({'output': output, 'result': result, 'comparison': comparison}, ensure_ascii=False))
+    else:
+        print_results(result, comparison)
+        print(f'\nResults saved to {output}')
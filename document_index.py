@@ -0,0 +1,277 @@
+"""In-process secondary indexes and a query API over locally synced documents.
+
+Answers questions such as "documents from vendor X in accountancy month Y with
+status manualentry" from the files already on disk, without calling the API.
+Documents are loaded from any of the local outputs: in_accounting.json, the
+snapshot JSON, or the JSON Lines files written by job_queue/enrich.
+
+Indexes (all built in memory when documents are added):
+- hash:      documentId (unique), documentNumber, documentVendorVatId,
+             documentCustomerVatId, documentStatus
+- sorted:    documentDate, updatedOn, documentTotalAmount (bisect range scans)
+- composite: (accountancyYear, accountancyMonth)
+
+Query API:
+  idx = DocumentIndex.from_files([r'C:\\temp\\in_accounting.json'])
+  page = idx.query(filters={'documentVendorVatId': 'PT509999999', 'documentStatus': 'manualentry',
+                            'accountancyYear': 2025, 'accountancyMonth': 3},
+                   ranges={'documentTotalAmount': (100, None)},
+                   order_by='documentDate', descending=True, offset=0, limit=50)
+  page -> {'items': [...], 'total': n, 'offset': 0, 'limit': 50}
+
+Filter values may be a single value or a list (any of). Ranges are inclusive;
+None leaves a bound open.
+
+Usage (CLI / VFP):
+  python document_index.py --source C:\\temp\\in_accounting.json --vendor PT509999999 --year 2025 --month 3 --status manualentry
+  python document_index.py --source C:\\temp\\bizdocs_snapshot.json --amount-min 1000 --order-by documentTotalAmount --desc --machine-json
+"""
+
+import os
+import json
+from bisect import bisect_left, bisect_right
+
+HASH_FIELDS = ('documentId', 'documentNumber', 'documentVendorVatId', 'documentCustomerVatId', 'documentStatus')
+SORTED_FIELDS = ('documentDate', 'updatedOn', 'documentTotalAmount')
+PERIOD_FIELDS = ('accountancyYear', 'accountancyMonth')
+
+
+def load_documents(path: str):
+    """Return the documents stored in a local JSON ({'items': [...]} or a list) or JSON Lines file."""
+    with open(path, 'r', encoding='utf-8') as fh:
+        if path.lower().endswith('.jsonl'):
+            return [json.loads(line) for line in fh if line.strip()]
+        data = json.load(fh)
+    if isinstance(data, dict):
+        data = data.get('items') or []
+    return [d for d in data if isinstance(d, dict)]
+
+
+def _sort_key(value):
+    """Make values of mixed types comparable; None/'' sort first."""
+    if value is None or value == '':
+        return (0, '')
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+
+def _as_set(value):
+    return set(value) if isinstance(value, (list, tuple, set)) else {value}
+
+
+class DocumentIndex:
+    """Documents plus hash, sorted and composite indexes. Re-adding a documentId replaces it."""
+
+    def __init__(self, items=()):
+        self.docs = []            # position -> document (None when replaced)
+        self.by_id = {}           # documentId -> position
+        self.hash = {f: {} for f in HASH_FIELDS}          # field -> value -> set(positions)
+        self.period = {}          # (year, month) -> set(positions)
+        self._sorted = {}         # field -> (keys, positions); rebuilt lazily after changes
+        self.add_many(items)
+
+    @classmethod
+    def from_files(cls, paths):
+        idx = cls()
+        for path in paths:
+            idx.add_many(load_documents(path))
+        return idx
+
+    def __len__(self):
+        return sum(1 for d in self.docs if d is not None)
+
+    # --- maintenance ---
+    def _unindex(self, pos):
+        doc = self.docs[pos]
+        for f in HASH_FIELDS:
+            bucket = self.hash[f].get(doc.get(f))
+            if bucket is not None:
+                bucket.discard(pos)
+        bucket = self.period.get((doc.get('accountancyYear'), doc.get('accountancyMonth')))
+        if bucket is not None:
+            bucket.discard(pos)
+        self.docs[pos] = None
+
+    def add(self, doc: dict):
+        doc_id = doc.get('documentId')
+        if doc_id and doc_id in self.by_id:
+            self._unindex(self.by_id[doc_id])
+        pos = len(self.docs)
+        self.docs.append(doc)
+        if doc_id:
+            self.by_id[doc_id] = pos
+        for f in HASH_FIELDS:
+            self.hash[f].setdefault(doc.get(f), set()).add(pos)
+        self.period.setdefault((doc.get('accountancyYear'), doc.get('accountancyMonth')), set()).add(pos)
+        self._sorted.clear()
+
+    def add_many(self, docs):
+        for d in docs:
+            self.add(d)
+
+    def _sorted_index(self, field):
+        if field not in self._sorted:
+            pairs = sorted((_sort_key(d.get(field)), pos) for pos, d in enumerate(self.docs) if d is not None)
+            self._sorted[field] = ([k for k, _ in pairs], [p for _, p in pairs])
+        return self._sorted[field]
+
+    # --- lookups ---
+    def get(self, document_id: str):
+        pos = self.by_id.get(document_id)
+        return self.docs[pos] if pos is not None else None
+
+    def _range_positions(self, field, low, high):
+        keys, positions = self._sorted_index(field)
+        lo = 0 if low is None else bisect_left(keys, _sort_key(low))
+        hi = len(keys) if high is None else bisect_right(keys, _sort_key(high))
+        return positions[lo:hi]
+
+    def _candidates(self, filters, ranges):
+        """Return a set of positions matching the equality filters (None = no equality filter)."""
+        sets = []
+        year = filters.get('accountancyYear')
+        month = filters.get('accountancyMonth')
+        if year is not None and month is not None:
+            sets.append(set().union(*[self.period.get((y, m), set()) for y in _as_set(year) for m in _as_set(month)]))
+        for field, value in filters.items():
+            if field in PERIOD_FIELDS and year is not None and month is not None:
+                continue
+            if field in HASH_FIELDS:
+                sets.append(set().union(*[self.hash[field].get(v, set()) for v in _as_set(value)]))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            result &= s
+            if not result:
+                break
+        return result
+
+    def _matches(self, doc, filters, ranges):
+        for field, value in filters.items():
+            if doc.get(field) not in _as_set(value):
+                return False
+        for field, (low, high) in ranges.items():
+            key = _sort_key(doc.get(field))
+            if low is not None and key < _sort_key(low):
+                return False
+            if high is not None and key > _sort_key(high):
+                return False
+        return True
+
+    def query(self, filters: dict = None, ranges: dict = None, order_by: str = 'documentDate',
+              descending: bool = False, offset: int = 0, limit: int = 100):
+        """Filter, sort and paginate the indexed documents. Returns {'items', 'total', 'offset', 'limit'}."""
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        ranges = {k: tuple(v) for k, v in (ranges or {}).items() if v and (v[0] is not None or v[1] is not None)}
+        offset = max(0, int(offset or 0))
+        limit = None if limit is None else max(0, int(limit))
+
+        candidates = self._candidates(filters, ranges)
+        if candidates is None:
+            # no equality filter: start from the narrowest indexed range, or everything
+            indexed = [f for f in ranges if f in SORTED_FIELDS]
+            if indexed:
+                scans = [self._range_positions(f, *ranges[f]) for f in indexed]
+                candidates = set(min(scans, key=len))
+            else:
+                candidates = {pos for pos, d in enumerate(self.docs) if d is not None}
+
+        matched = [pos for pos in candidates if self._matches(self.docs[pos], filters, ranges)]
+        total = len(matched)
+
+        if order_by in SORTED_FIELDS and total > 64:
+            # walk the sorted index and keep members: avoids sorting large result sets
+            _, positions = self._sorted_index(order_by)
+            wanted = set(matched)
+            ordered = (p for p in (reversed(positions) if descending else positions) if p in wanted)
+        else:
+            ordered = sorted(matched, key=lambda p: (_sort_key(self.docs[p].get(order_by)) if order_by else (0, ''), p),
+                             reverse=descending)
+        page = []
+        for i, pos in enumerate(ordered):
+            if i < offset:
+                continue
+            if limit is not None and len(page) >= limit:
+                break
+            page.append(self.docs[pos])
+        return {'items': page, 'total': total, 'offset': offset, 'limit': limit}
+
+
+_cached = {}   # tuple(paths) -> (mtimes, DocumentIndex)
+
+
+def load_index(paths):
+    """Return a DocumentIndex over `paths`, reusing the previous one while the files are unchanged."""
+    paths = tuple(paths)
+    mtimes = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+    hit = _cached.get(paths)
+    if hit and hit[0] == mtimes:
+        return hit[1]
+    idx = DocumentIndex.from_files([p for p in paths if os.path.exists(p)])
+    _cached[paths] = (mtimes, idx)
+    return idx
+
+
+if __name__ == '__main__':
+    import argparse
+    import main
+
+    parser = argparse.ArgumentParser(description='Query locally synced documents (no network)')
+    parser.add_argument('--source', action='append', help='JSON/JSONL file(s) to index (default: in_accounting.json)')
+    parser.add_argument('--id', help='documentId')
+    parser.add_argument('--number', help='documentNumber')
+    parser.add_argument('--vendor', help='documentVendorVatId (comma-separated for any of)')
+    parser.add_argument('--customer', help='documentCustomerVatId (comma-separated for any of)')
+    parser.add_argument('--status', help='documentStatus (comma-separated for any of)')
+    parser.add_argument('--year', type=int, help='accountancyYear')
+    parser.add_argument('--month', type=int, help='accountancyMonth')
+    parser.add_argument('--date-from', help='documentDate >= (YYYY-MM-DD)')
+    parser.add_argument('--date-to', help='documentDate <= (YYYY-MM-DD)')
+    parser.add_argument('--updated-from', help='updatedOn >=')
+    parser.add_argument('--updated-to', help='updatedOn <=')
+    parser.add_argument('--amount-min', type=float)
+    parser.add_argument('--amount-max', type=float)
+    parser.add_argument('--order-by', default='documentDate')
+    parser.add_argument('--desc', action='store_true')
+    parser.add_argument('--offset', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--output', help='Write the result page as JSON to this path (e.g. for VFP FileToStr)')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON (for VFP)')
+    args = parser.parse_args()
+
+    def _multi(v):
+        if v is None:
+            return None
+        values = [x.strip() for x in v.split(',') if x.strip()]
+        return values[0] if len(values) == 1 else values
+
+    filters = {
+        'documentId': args.id,
+        'documentNumber': args.number,
+        'documentVendorVatId': _multi(args.vendor),
+        'documentCustomerVatId': _multi(args.customer),
+        'documentStatus': _multi(args.status),
+        'accountancyYear': args.year,
+        'accountancyMonth': args.month,
+    }
+    ranges = {
+        'documentDate': (args.date_from, args.date_to),
+        'updatedOn': (args.updated_from, args.updated_to),
+        'documentTotalAmount': (args.amount_min, args.amount_max),
+    }
+    index = load_index(args.source or [main.IN_ACCOUNTING_JSON_PATH])
+    result = index.query(filters, ranges, order_by=args.order_by, descending=args.desc,
+                         offset=args.offset, limit=args.limit)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(result, fh, ensure_ascii=False, indent=2)
+    if args.machine_json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"{result['total']} documents match; showing {len(result['items'])} from offset {result['offset']}")
+        for it in result['items']:
+            print(f"{it.get('documentDate', '')} {it.get('documentNumber', '')} vendor={it.get('documentVendorVatId', '')} "
+                  f"amount={it.get('documentTotalAmount', '')} status={it.get('documentStatus', '')} id={it.get('documentId', '')}")
@@ -0,0 +1,331 @@
+"""Pipelined enrichment of InAccounting items with ExtractedMetadata.
+
+Replaces the manual flow (run InAccounting, copy the documentIds into
+DOCUMENT_IDS or --ids, run ExtractedMetadata) with one pipeline:
+
+  InAccounting pages  ->  batches of documentIds  ->  ExtractedMetadata workers
+      (1 thread)                                         (N threads)
+
+A producer thread follows the InAccounting pagination and hands full batches to
+a pool of metadata workers while later pages are still downloading, so the
+total time is close to max(list time, metadata time) instead of their sum.
+
+Metadata is cached per documentId together with the item's `updatedOn`
+(METADATA_CACHE_PATH). Items whose cached `updatedOn` is unchanged are emitted
+straight away without a metadata request.
+
+Requests answered with 429/5xx are retried (honouring Retry-After). If the run
+still ends with errors, the records go to `<output>.partial` and the previous
+output is left in place; the CLI then exits with status 1.
+
+Each enriched record is the canonical item (see `main.canonicalize_item`) plus:
+- documentType, metadata ({field name: value}) and metadataFields (raw list)
+- metadataSource: 'api', 'cache' or 'missing'
+- metadataError: set when the metadata request for its batch failed
+
+Usage:
+  python enrich.py --vatid PT504419811 --batch-size 50 --workers 4
+  python enrich.py --output C:\\temp\\enriched.jsonl --machine-json
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+
+import main
+import metrics
+import auth_manager
+
+METADATA_CACHE_PATH = r'C:\temp\bizdocs_metadata_cache.json'
+ENRICHED_JSONL_PATH = r'C:\temp\in_accounting_enriched.jsonl'
+MAX_RETRIES = 5  # resends per request on 429/5xx
+
+
+class MetadataCache:
+    """ExtractedMetadata items keyed by documentId, valid while `updatedOn` is unchanged."""
+
+    def __init__(self, path: str = METADATA_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    self.entries = json.load(fh) or {}
+            except Exception:
+                # a corrupt cache only costs extra requests
+                self.entries = {}
+
+    def get(self, document_id: str, updated_on: str):
+        """Return the cached metadata item, or None when absent or stale."""
+        if not document_id or not updated_on:
+            return None
+        with self._lock:
+            entry = self.entries.get(document_id)
+        if entry and entry.get('updatedOn') == updated_on:
+            return entry.get('metadata')
+        return None
+
+    def put(self, document_id: str, updated_on: str, metadata: dict):
+        if not document_id or not updated_on:
+            return
+        with self._lock:
+            self.entries[document_id] = {'updatedOn': updated_on, 'metadata': metadata}
+            self.dirty = True
+
+    def save(self):
+        """Write the cache atomically if it changed. Returns the path or None."""
+        if not self.path or not self.dirty:
+            return None
+        save_dir = os.path.dirname(self.path)
+        if save_dir and not os.path.exists(save_dir):
+            os.makedirs(save_dir, exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with self._lock:
+            with open(tmp, 'w', encoding='utf-8') as fh:
+                json.dump(self.entries, fh, ensure_ascii=False)
+            self.dirty = False
+        os.replace(tmp, self.path)
+        return self.path
+
+
+def enriched_record(item: dict, metadata: dict = None, source: str = 'api', error: str = None):
+    """Combine a canonical item and its ExtractedMetadata item into one record."""
+    rec = dict(item)
+    fields = (metadata or {}).get('fields') or []
+    rec['documentType'] = (metadata or {}).get('documentType', '')
+    rec['metadata'] = {f.get('name'): f.get('value') for f in fields if isinstance(f, dict)}
+    rec['metadataFields'] = fields
+    rec['metadataSource'] = source if metadata is not None else 'missing'
+    if error:
+        rec['metadataError'] = error
+    return rec
+
+
+class Enricher:
+    """Run the InAccounting -> ExtractedMetadata pipeline; iterate `run()` for enriched records.
+
+    At most `max_pending` metadata batches are queued or running at once and the
+    record queue is bounded, so listing waits when the consumer or the metadata
+    workers fall behind. Closing `run()` early stops the listing and skips batches
+    that have not started.
+
+    After `run()` is exhausted, `stats` holds items, pages, batches, cache_hits,
+    fetched, missing, errors and the list/total elapsed times.
+    """
+
+    def __init__(self, vatid=None, payload: dict = None, batch_size: int = 50, workers: int = 2,
+                 cache: MetadataCache = None, timeout: int = 30, max_retries: int = MAX_RETRIES,
+                 max_pending: int = None):
+        self.vatid = vatid or main.VATID
+        self.payload = dict(payload if payload is not None else {'documentStatus': ['accountvalidation', 'manualentry']})
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.cache = cache if cache is not None else MetadataCache()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_pending = max_pending or 2 * self.workers
+        self.stats = {'items': 0, 'pages': 0, 'batches': 0, 'cache_hits': 0, 'fetched': 0, 'missing': 0,
+                      'errors': [], 'list_elapsed_s': 0.0, 'elapsed_s': 0.0}
+        self._queue = queue.Queue(maxsize=self.batch_size * (self.max_pending + 1))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stop = threading.Event()
+
+    def _put(self, message):
+        """Hand a message to run(); blocks while the queue is full, gives up once run() has stopped."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _submit(self, pool, batch):
+        """Queue a metadata batch, waiting for a free slot. Returns False when stopped."""
+        while not self._stop.is_set():
+            if self._slots.acquire(timeout=0.1):
+                try:
+                    pool.submit(self._run_batch, batch)
+                except Exception:
+                    self._slots.release()
+                    raise
+                return True
+        return False
+
+    def _run_batch(self, batch):
+        try:
+            if self._stop.is_set():
+                return
+            ids = [it['documentId'] for it in batch]
+            try:
+                resp, meta_items = main.fetch_extracted_metadata(ids, vatid=self.vatid, timeout=self.timeout,
+                                                                 max_retries=self.max_retries)
+                if resp.status_code >= 400:
+                    raise RuntimeError(f'ExtractedMetadata HTTP {resp.status_code}')
+                by_id = {m.get('documentId'): m for m in meta_items if isinstance(m, dict)}
+                for it in batch:
+                    meta = by_id.get(it['documentId'])
+                    if meta is not None:
+                        self.cache.put(it['documentId'], it.get('updatedOn'), meta)
+                    self._put(('record', enriched_record(it, meta, 'api')))
+            except Exception as e:
+                self._put(('error', str(e)))
+                for it in batch:
+                    self._put(('record', enriched_record(it, None, error=str(e))))
+        finally:
+            self._slots.release()
+            self._put(('batch_done', None))
+
+    def _produce(self, pool, start):
+        batches = 0
+        batch = []
+        body = dict(self.payload)
+        body.pop('paginationKey', None)
+        try:
+            while not self._stop.is_set():
+                resp, items, key = main.search_documents('InAccounting', vatid=self.vatid, payload=body,
+                                                         timeout=self.timeout, max_retries=self.max_retries)
+                self._put(('page', None))
+                if resp.status_code >= 400:
+                    self._put(('error', f'InAccounting HTTP {resp.status_code}'))
+                    break
+                for raw in items:
+                    if self._stop.is_set():
+                        break
+                    it = main.canonicalize_item(raw)
+                    if not it['documentId']:
+                        self._put(('record', enriched_record(it, None)))
+                        continue
+                    cached = self.cache.get(it['documentId'], it['updatedOn'])
+                    if cached is not None:
+                        metrics.record_event('cache_hit', endpoint='Documents/ExtractedMetadata', vatid=self.vatid)
+                        self._put(('record', enriched_record(it, cached, 'cache')))
+                        continue
+                    batch.append(it)
+                    if len(batch) >= self.batch_size:
+                        if self._submit(pool, batch):
+                            batches += 1
+                        batch = []
+                if not key or key == body.get('paginationKey'):
+                    break
+                body['paginationKey'] = key
+        except Exception as e:
+            self._put(('error', str(e)))
+        finally:
+            if batch and self._submit(pool, batch):
+                batches += 1
+            self.stats['list_elapsed_s'] = round(time.perf_counter() - start, 4)
+            self._put(('produced', batches))
+
+    def run(self):
+        """Generator of enriched records, in completion order."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not auth_manager.get_access_token():
+            raise RuntimeError('Não foi possível obter token de acesso')
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        producer = threading.Thread(target=self._produce, args=(pool, start), daemon=True)
+        producer.start()
+        total_batches, done_batches = None, 0
+        try:
+            while total_batches is None or done_batches < total_batches:
+                kind, value = self._queue.get()
+                if kind == 'record':
+                    self.stats['items'] += 1
+                    src = value['metadataSource']
+                    key = {'cache': 'cache_hits', 'api': 'fetched'}.get(src, 'missing')
+                    self.stats[key] += 1
+                    yield value
+                elif kind == 'page':
+                    self.stats['pages'] += 1
+                elif kind == 'batch_done':
+                    done_batches += 1
+                elif kind == 'produced':
+                    total_batches = value
+                    self.stats['batches'] = value
+                elif kind == 'error':
+                    self.stats['errors'].append(value)
+        finally:
+            # stops the listing and any batch not yet started when the caller stops early
+            self._stop.set()
+            producer.join()
+            pool.shutdown(wait=True)
+            self.stats['elapsed_s'] = round(time.perf_counter() - start, 4)
+            try:
+                self.cache.save()
+            except Exception:
+                if main.DEBUG:
+                    print(f'Warning: failed to write metadata cache to {self.cache.path}')
+
+
+def enrich_in_accounting(vatid=None, payload: dict = None, batch_size: int = 50, workers: int = 2,
+                         output_path: str = None, cache: MetadataCache = None):
+    """Run the pipeline and write one enriched record per line to `output_path`.
+
+    Returns (records, stats). output_path defaults to ENRICHED_JSONL_PATH; '' = don't write.
+    The file is written to a temp path and only replaces output_path when the run had no
+    errors; otherwise it is renamed to `<output_path>.partial`. stats['output'] holds the
+    path actually written (or None).
+    """
+    enricher = Enricher(vatid=vatid, payload=payload, batch_size=batch_size, workers=workers, cache=cache)
+    path = ENRICHED_JSONL_PATH if output_path is None else output_path
+    records = []
+    fh = None
+    tmp = f'{path}.tmp' if path else None
+    if path:
+        save_dir = os.path.dirname(path)
+        if save_dir and not os.path.exists(save_dir):
+            os.makedirs(save_dir, exist_ok=True)
+        fh = open(tmp, 'w', encoding='utf-8')
+    try:
+        for rec in enricher.run():
+            records.append(rec)
+            if fh:
+                fh.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    except BaseException:
+        if fh:
+            fh.close()
+            os.remove(tmp)
+        raise
+    enricher.stats['output'] = None
+    if fh:
+        fh.close()
+        final = path if not enricher.stats['errors'] else f'{path}.partial'
+        os.replace(tmp, final)
+        enricher.stats['output'] = final
+    return records, enricher.stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Enrich InAccounting items with ExtractedMetadata in one pipeline')
+    parser.add_argument('--url', default=main.BASE_URL, help='Base URL or template (default from main.BASE_URL)')
+    parser.add_argument('--vatid', default=main.VATID, help='Company VAT id')
+    parser.add_argument('--batch-size', type=int, default=50, help='documentIds per ExtractedMetadata request')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent ExtractedMetadata requests')
+    parser.add_argument('--cache', default=METADATA_CACHE_PATH, help="Metadata cache path ('' disables the cache file)")
+    parser.add_argument('--output', default=ENRICHED_JSONL_PATH, help='Enriched records (JSON Lines)')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON summary (for VFP)')
+    args = parser.parse_args()
+
+    main.BASE_URL = args.url
+    records, stats = enrich_in_accounting(vatid=args.vatid, batch_size=args.batch_size, workers=args.workers,
+                                          output_path=args.output, cache=MetadataCache(args.cache or None))
+    if args.machine_json:
+        print(json.dumps(stats, ensure_ascii=False))
+    else:
+        print(f"{stats['items']} items from {stats['pages']} pages: {stats['fetched']} fetched in "
+              f"{stats['batches']} batches, {stats['cache_hits']} from cache, {stats['missing']} without metadata")
+        print(f"List time {stats['list_elapsed_s']}s, total {stats['elapsed_s']}s -> {stats['output']}")
+        for err in stats['errors']:
+            print(f'Error: {err}')
+        if stats['errors'] and args.output:
+            print(f'Run incomplete: {args.output} was not replaced')
+    if stats['errors']:
+        raise SystemExit(1)
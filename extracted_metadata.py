@@ -7,13 +7,14 @@ Or run from the command-line to test:
   python extracted_metadata.py --url https://arquivodigitalpp.bizdocs.mobi --vatid PT504419811 --ids id1,id2
 
 This file is intentionally minimal and mirrors the style of `auth_manager.py`.
+`requests` and `argparse` are imported lazily to keep process startup fast; use
+--profile-startup to print the cold import time of each module.
 """
 
 import time
 import json
-import argparse
-import requests
 import auth_manager
+import metrics
 
 
 def call_extracted_metadata(base_url, vatid, document_ids, use_token=True, timeout=30):
@@ -53,7 +54,7 @@ def call_extracted_metadata(base_url, vatid, document_ids, use_token=True, timeo
 
     payload = {'requests': list(document_ids)}
 
-    resp = requests.post(endpoint, headers=headers, json=payload, timeout=timeout)
+    resp = metrics.instrumented_request('POST', endpoint, vatid=vatid, headers=headers, json=payload, timeout=timeout)
 
     print('URL:', endpoint)
     print('Status:', resp.status_code)
@@ -70,12 +71,22 @@ def call_extracted_metadata(base_url, vatid, document_ids, use_token=True, timeo
 
 
 if __name__ == '__main__':
+    import argparse
+
     parser = argparse.ArgumentParser(description='Call ExtractedMetadata endpoint with a list of document ids')
-    parser.add_argument('--url', required=True, help='Base URL or full endpoint (e.g. https://arquivodigitalpp.bizdocs.mobi)')
+    parser.add_argument('--url', help='Base URL or full endpoint (e.g. https://arquivodigitalpp.bizdocs.mobi)')
     parser.add_argument('--vatid', default='PT504419811', help='Company VAT id (default PT504419811)')
-    parser.add_argument('--ids', required=True, help='Comma-separated document ids')
+    parser.add_argument('--ids', help='Comma-separated document ids')
     parser.add_argument('--no-token', action='store_true', help='Do not use Authorization header')
+    parser.add_argument('--profile-startup', action='store_true', help='Report cold import time per module and exit')
     args = parser.parse_args()
 
+    if args.profile_startup:
+        import startup_profile
+        startup_profile.print_startup_profile(startup_profile.profile_startup())
+        raise SystemExit(0)
+    if not args.url or not args.ids:
+        parser.error('--url and --ids are required')
+
     ids = [i.strip() for i in args.ids.split(',') if i.strip()]
     call_extracted_metadata(args.url, args.vatid, ids, use_token=not args.no_token)
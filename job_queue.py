@@ -0,0 +1,539 @@
+"""Durable job queue and scheduler for sync and posting work (SQLite-backed).
+
+Jobs survive crashes: each job stores a checkpoint (pagination key, output file
+offset, processed index range) that its handler updates as it goes, and a job
+whose worker disappears is re-queued once its lease expires and resumes from the
+last checkpoint instead of starting over (after max_attempts it is marked failed).
+
+- enqueue(kind, vatid, params, priority): identical queued/running jobs are
+  deduplicated (same kind, vatid and params) and the existing job id is returned
+- priorities: higher runs first; ties run oldest first
+- schedules: periodic jobs per company (e.g. a sync every hour)
+- Scheduler: runs up to `workers` jobs at once, at most `per_company` per VAT id
+
+Built-in job kinds (see HANDLERS, extend with @register_handler):
+
+  sync     params: search (default InAccounting), payload, output
+           Follows the search pagination, appending canonical items to a JSON
+           Lines file; checkpoint = {paginationKey, offset, items, pages}.
+  post     params: requests (AccountingOperations bodies), chunk_size
+           POSTs the bodies in chunks; checkpoint = {processed, failed}.
+
+Usage:
+  python job_queue.py enqueue sync --vatid PT504419811 --priority 5
+  python job_queue.py schedule sync --vatid PT504419811 --every 3600
+  python job_queue.py run --workers 4 --until-idle
+  python job_queue.py list
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+
+import main
+import metrics
+
+JOBS_DB_PATH = r'C:\temp\bizdocs_jobs.sqlite3'
+LEASE_SECONDS = 60        # a running job whose lease expires is considered abandoned
+RETRY_DELAY_SECONDS = 30  # base delay before a failed job is retried (multiplied by attempt)
+NOT_PROCESSED_STATUSES = (429, 503)  # AccountingOperations answers that are safe to post again
+
+HANDLERS = {}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    vatid TEXT NOT NULL DEFAULT '',
+    params TEXT NOT NULL DEFAULT '{}',
+    dedup_key TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    checkpoint TEXT,
+    result TEXT,
+    error TEXT,
+    run_after REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedup ON jobs(dedup_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS jobs_pick ON jobs(status, priority DESC, id);
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    vatid TEXT NOT NULL DEFAULT '',
+    params TEXT NOT NULL DEFAULT '{}',
+    interval_s REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    next_run REAL NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    UNIQUE(kind, vatid, params)
+);
+'''
+
+
+def register_handler(kind: str):
+    """Decorator registering `fn(job, ctx)` as the handler for jobs of `kind`."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def _dedup_key(kind, vatid, params):
+    raw = json.dumps([kind, vatid or '', params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    for key in ('params', 'checkpoint', 'result'):
+        job[key] = json.loads(job[key]) if job.get(key) else ({} if key == 'params' else None)
+    return job
+
+
+class JobQueue:
+    """Persistent job queue stored in a SQLite file. Safe to use from several threads and processes."""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        db_dir = os.path.dirname(path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # one short-lived connection per operation: sqlite3 connections must not be shared across threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return _Closing(conn)
+
+    # --- producers ---
+    def enqueue(self, kind: str, vatid: str = '', params: dict = None, priority: int = 0,
+                run_after: float = 0, max_attempts: int = 3):
+        """Add a job and return its id, or the id of an identical job that is already queued or running."""
+        params = params or {}
+        key = _dedup_key(kind, vatid, params)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT id, priority FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running')",
+                               (key,)).fetchone()
+            if row is not None:
+                if priority > row['priority']:
+                    conn.execute('UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?', (priority, now, row['id']))
+                conn.execute('COMMIT')
+                return row['id']
+            cur = conn.execute(
+                'INSERT INTO jobs (kind, vatid, params, dedup_key, priority, max_attempts, run_after, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (kind, vatid or '', json.dumps(params, ensure_ascii=False), key, priority, max_attempts,
+                 run_after or 0, now, now))
+            conn.execute('COMMIT')
+            return cur.lastrowid
+
+    def add_schedule(self, kind: str, vatid: str, interval_s: float, params: dict = None, priority: int = 0,
+                     first_run: float = None):
+        """Create or update a periodic job. Returns the schedule id."""
+        params_json = json.dumps(params or {}, sort_keys=True, ensure_ascii=False)
+        first_run = time.time() if first_run is None else first_run
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO schedules (kind, vatid, params, interval_s, priority, next_run) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(kind, vatid, params) DO UPDATE SET interval_s = excluded.interval_s, '
+                'priority = excluded.priority, enabled = 1',
+                (kind, vatid or '', params_json, interval_s, priority, first_run))
+            return conn.execute('SELECT id FROM schedules WHERE kind = ? AND vatid = ? AND params = ?',
+                                (kind, vatid or '', params_json)).fetchone()['id']
+
+    def remove_schedule(self, schedule_id: int):
+        with self._connect() as conn:
+            conn.execute('UPDATE schedules SET enabled = 0 WHERE id = ?', (schedule_id,))
+
+    def enqueue_due_schedules(self, now: float = None):
+        """Enqueue a job for every schedule whose next_run has passed. Returns the job ids."""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            due = conn.execute('SELECT * FROM schedules WHERE enabled = 1 AND next_run <= ?', (now,)).fetchall()
+            for s in due:
+                # skip missed runs instead of enqueuing them all after downtime
+                next_run = s['next_run'] + s['interval_s'] * max(1, int((now - s['next_run']) // s['interval_s']) + 1)
+                conn.execute('UPDATE schedules SET next_run = ? WHERE id = ?', (next_run, s['id']))
+        return [self.enqueue(s['kind'], s['vatid'], json.loads(s['params']), s['priority']) for s in due]
+
+    # --- workers ---
+    def claim(self, worker: str, exclude_vatids=(), lease_s: float = LEASE_SECONDS):
+        """Atomically take the next runnable job (highest priority first). Returns the job dict or None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            sql = "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ?"
+            args = [now]
+            if exclude_vatids:
+                sql += f" AND vatid NOT IN ({','.join('?' * len(exclude_vatids))})"
+                args.extend(exclude_vatids)
+            row = conn.execute(sql + ' ORDER BY priority DESC, id LIMIT 1', args).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                         'updated_at = ? WHERE id = ?', (worker, now + lease_s, now, row['id']))
+            conn.execute('COMMIT')
+            job = _row_to_job(row)
+            job.update({'status': 'running', 'worker': worker, 'attempts': row['attempts'] + 1})
+            return job
+
+    def save_checkpoint(self, job_id: int, checkpoint: dict, lease_s: float = LEASE_SECONDS):
+        """Persist a job's progress and extend its lease."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET checkpoint = ?, lease_until = ?, updated_at = ? WHERE id = ?',
+                         (json.dumps(checkpoint, ensure_ascii=False), now + lease_s, now, job_id))
+
+    def heartbeat(self, job_ids, lease_s: float = LEASE_SECONDS):
+        if not job_ids:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET lease_until = ? WHERE status = 'running' AND id IN ({','.join('?' * len(job_ids))})",
+                         [now + lease_s] + list(job_ids))
+
+    def complete(self, job_id: int, result=None):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                         'WHERE id = ?', (json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def fail(self, job_id: int, error: str, retry_delay: float = RETRY_DELAY_SECONDS):
+        """Re-queue the job (keeping its checkpoint) or mark it failed after max_attempts."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            if row['attempts'] < row['max_attempts']:
+                conn.execute("UPDATE jobs SET status = 'queued', error = ?, run_after = ?, lease_until = NULL, "
+                             'updated_at = ? WHERE id = ?', (error, now + retry_delay * row['attempts'], now, job_id))
+            else:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? "
+                             'WHERE id = ?', (error, now, job_id))
+
+    def recover_stale(self, now: float = None):
+        """Re-queue running jobs whose lease expired (their worker crashed). Returns how many.
+
+        A job that has already used max_attempts is marked failed instead, so a job that
+        kills its worker process is not retried forever.
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            failed = conn.execute("UPDATE jobs SET status = 'failed', error = 'lease expired (worker lost)', "
+                                  'worker = NULL, lease_until = NULL, updated_at = ? '
+                                  "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                                  (now, now)).rowcount
+            requeued = conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, "
+                                    "updated_at = ? WHERE status = 'running' AND lease_until < ?",
+                                    (now, now)).rowcount
+            return failed + requeued
+
+    # --- inspection ---
+    def get(self, job_id: int):
+        with self._connect() as conn:
+            return _row_to_job(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def list_jobs(self, status: str = None, limit: int = 100):
+        with self._connect() as conn:
+            if status:
+                rows = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?', (status, limit))
+            else:
+                rows = conn.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,))
+            return [_row_to_job(r) for r in rows.fetchall()]
+
+    def pending(self, now: float = None):
+        """Number of queued jobs plus running jobs whose lease is still live (in any process)."""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' "
+                                "OR (status = 'running' AND lease_until >= ?)", (now,)).fetchone()[0]
+
+    def counts(self):
+        with self._connect() as conn:
+            return {r['status']: r['n'] for r in conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')}
+
+
+class _Closing:
+    """Context manager closing a sqlite3 connection (sqlite3's own only ends the transaction)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.conn.in_transaction:
+            self.conn.execute('ROLLBACK')
+        self.conn.close()
+
+
+class JobContext:
+    """Passed to handlers: read `checkpoint`, call `save(checkpoint)` after each unit of work."""
+
+    def __init__(self, queue: JobQueue, job: dict):
+        self.queue = queue
+        self.job = job
+        self.checkpoint = dict(job.get('checkpoint') or {})
+
+    def save(self, checkpoint: dict):
+        self.checkpoint = dict(checkpoint)
+        self.queue.save_checkpoint(self.job['id'], self.checkpoint)
+
+
+class Scheduler:
+    """Enqueue due schedules and run queued jobs on a bounded thread pool."""
+
+    def __init__(self, queue: JobQueue, workers: int = 2, per_company: int = 1, poll_interval: float = 1.0):
+        self.queue = queue
+        self.workers = max(1, workers)
+        self.per_company = max(1, per_company)
+        self.poll_interval = poll_interval
+        self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._active = {}   # job id -> vatid
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_job(self, job):
+        try:
+            handler = HANDLERS.get(job['kind'])
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind '{job['kind']}'")
+            result = handler(job, JobContext(self.queue, job))
+            self.queue.complete(job['id'], result)
+        except Exception as e:
+            self.queue.fail(job['id'], str(e))
+        finally:
+            with self._lock:
+                self._active.pop(job['id'], None)
+
+    def _busy_vatids(self):
+        counts = {}
+        for vatid in self._active.values():
+            counts[vatid] = counts.get(vatid, 0) + 1
+        return [v for v, n in counts.items() if v and n >= self.per_company]
+
+    def run(self, until_idle: bool = False):
+        """Process jobs until stop() is called, or until nothing is queued or running when until_idle.
+
+        Every poll renews the leases of this scheduler's jobs and recovers jobs whose lease
+        expired, including those left by another scheduler process that crashed.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop.is_set():
+                self.queue.enqueue_due_schedules()
+                with self._lock:
+                    active_ids = list(self._active)
+                self.queue.heartbeat(active_ids)
+                self.queue.recover_stale()
+                started = False
+                while True:
+                    with self._lock:
+                        if len(self._active) >= self.workers:
+                            break
+                        busy = self._busy_vatids()
+                    job = self.queue.claim(self.worker_id, exclude_vatids=busy)
+                    if job is None:
+                        break
+                    with self._lock:
+                        self._active[job['id']] = job['vatid']
+                    pool.submit(self._run_job, job)
+                    started = True
+                if until_idle and not started:
+                    with self._lock:
+                        idle = not self._active
+                    if idle and not self.queue.pending():
+                        break
+                self._stop.wait(self.poll_interval if not started else 0.05)
+
+
+# --- built-in handlers ---
+
+@register_handler('sync')
+def sync_handler(job, ctx: JobContext):
+    """Follow a Documents search to the last page, appending canonical items to a JSON Lines file.
+
+    Resume: the output file is truncated to the checkpointed offset (dropping a page
+    written after the last checkpoint) and the search continues from paginationKey.
+    """
+    params = job['params']
+    search = params.get('search', 'InAccounting')
+    vatid = job['vatid'] or main.VATID
+    output = params.get('output') or os.path.join(os.path.dirname(JOBS_DB_PATH), f'sync_{vatid}_{search}.jsonl')
+    payload = dict(params.get('payload') or ({'documentStatus': ['accountvalidation', 'manualentry']}
+                                              if search == 'InAccounting' else {}))
+    cp = ctx.checkpoint
+    offset = cp.get('offset', 0)
+    items, pages = cp.get('items', 0), cp.get('pages', 0)
+    if cp.get('paginationKey'):
+        payload['paginationKey'] = cp['paginationKey']
+    elif cp.get('done'):
+        return {'output': output, 'items': items, 'pages': pages}
+
+    out_dir = os.path.dirname(output)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+    with open(output, 'a+b') as fh:
+        fh.truncate(offset)
+        fh.seek(offset)
+        while True:
+            resp, page_items, key = main.search_documents(search, vatid=vatid, payload=payload)
+            if resp.status_code >= 400:
+                raise RuntimeError(f'{search} HTTP {resp.status_code}')
+            for it in page_items:
+                fh.write((json.dumps(main.canonicalize_item(it), ensure_ascii=False) + '\n').encode('utf-8'))
+            fh.flush()
+            os.fsync(fh.fileno())
+            items += len(page_items)
+            pages += 1
+            offset = fh.tell()
+            done = not key or key == payload.get('paginationKey')
+            ctx.save({'paginationKey': None if done else key, 'offset': offset, 'items': items, 'pages': pages,
+                      'done': done})
+            if done:
+                break
+            payload['paginationKey'] = key
+    return {'output': output, 'items': items, 'pages': pages}
+
+
+@register_handler('post')
+def post_handler(job, ctx: JobContext):
+    """POST AccountingOperations bodies in chunks, checkpointing the processed index range.
+
+    params.requests is the list of accounting request bodies (see the Postman
+    collection); bodies rejected by the API are collected in checkpoint.failed.
+
+    Posting is not idempotent, so a chunk is only resent when the API says it was
+    not processed (429/503, here or by re-running the job). Any other 5xx or a
+    read timeout may have been applied: the chunk goes to failed for manual review
+    and the job moves on instead of posting it again.
+    """
+    params = job['params']
+    bodies = params.get('requests') or []
+    chunk_size = max(1, int(params.get('chunk_size', 20)))
+    vatid = job['vatid'] or main.VATID
+    processed = ctx.checkpoint.get('processed', 0)
+    failed = list(ctx.checkpoint.get('failed', []))
+
+    import requests
+    import auth_manager
+    endpoint = main.build_company_endpoint(main.BASE_URL, vatid, {'api-bzd': main.DEFAULT_API_BZD,
+                                                                  'api-bzd-companyvatid': main.DEFAULT_VATID},
+                                           'AccountingOperations')
+    while processed < len(bodies):
+        chunk = bodies[processed:processed + chunk_size]
+        token = auth_manager.get_access_token()
+        if not token:
+            raise RuntimeError('Não foi possível obter token de acesso')
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': f'Bearer {token}'}
+        try:
+            resp = metrics.instrumented_request('POST', endpoint, vatid=vatid, headers=headers,
+                                                json={'requests': chunk}, timeout=60, max_retries=3,
+                                                retry_statuses=NOT_PROCESSED_STATUSES)
+        except requests.exceptions.ReadTimeout as e:
+            resp, outcome = None, f'timeout after sending ({e}); check before re-posting'
+        else:
+            outcome = None
+            if resp.status_code in NOT_PROCESSED_STATUSES:
+                # not applied by the API: safe to retry the whole job later from this chunk
+                raise RuntimeError(f'AccountingOperations HTTP {resp.status_code}')
+            if resp.status_code >= 500:
+                outcome = f'HTTP {resp.status_code}; may have been applied, check before re-posting'
+        if outcome:
+            failed.extend({'documentId': b.get('documentId'), 'errorMessage': outcome} for b in chunk)
+            processed += len(chunk)
+            ctx.save({'processed': processed, 'failed': failed})
+            continue
+        try:
+            data = resp.json()
+        except Exception:
+            data = None
+        if resp.status_code >= 400:
+            failed.extend({'documentId': b.get('documentId'), 'errorMessage': f'HTTP {resp.status_code}'} for b in chunk)
+        elif isinstance(data, dict):
+            failed.extend(data.get('errors') or [])
+        processed += len(chunk)
+        ctx.save({'processed': processed, 'failed': failed})
+    return {'processed': processed, 'failed': failed}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Durable BizDocs job queue')
+    parser.add_argument('--db', default=JOBS_DB_PATH, help='SQLite database path')
+    parser.add_argument('--url', default=main.BASE_URL, help='Base URL or template (default from main.BASE_URL)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_enq = sub.add_parser('enqueue', help='Queue a job')
+    p_enq.add_argument('kind', choices=sorted(HANDLERS))
+    p_enq.add_argument('--vatid', default=main.VATID)
+    p_enq.add_argument('--priority', type=int, default=0)
+    p_enq.add_argument('--params', default='{}', help='JSON object with handler params')
+    p_enq.add_argument('--params-file', help='JSON file with handler params (e.g. post requests)')
+
+    p_sched = sub.add_parser('schedule', help='Create or update a periodic job')
+    p_sched.add_argument('kind', choices=sorted(HANDLERS))
+    p_sched.add_argument('--vatid', default=main.VATID)
+    p_sched.add_argument('--every', type=float, required=True, help='Interval in seconds')
+    p_sched.add_argument('--priority', type=int, default=0)
+    p_sched.add_argument('--params', default='{}')
+
+    p_run = sub.add_parser('run', help='Run the scheduler and workers')
+    p_run.add_argument('--workers', type=int, default=2)
+    p_run.add_argument('--per-company', type=int, default=1, help='Max concurrent jobs per VAT id')
+    p_run.add_argument('--until-idle', action='store_true', help='Exit when no job is queued or running')
+
+    p_list = sub.add_parser('list', help='List jobs')
+    p_list.add_argument('--status')
+    p_list.add_argument('--machine-json', action='store_true', help='Print single-line JSON (for VFP)')
+    args = parser.parse_args()
+
+    main.BASE_URL = args.url
+    jq = JobQueue(args.db)
+    if args.command == 'enqueue':
+        params = json.loads(args.params)
+        if args.params_file:
+            with open(args.params_file, 'r', encoding='utf-8') as fh:
+                params.update(json.load(fh))
+        print(jq.enqueue(args.kind, args.vatid, params, args.priority))
+    elif args.command == 'schedule':
+        print(jq.add_schedule(args.kind, args.vatid, args.every, json.loads(args.params), args.priority))
+    elif args.command == 'run':
+        scheduler = Scheduler(jq, workers=args.workers, per_company=args.per_company)
+        try:
+            scheduler.run(until_idle=args.until_idle)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        print(json.dumps(jq.counts(), ensure_ascii=False))
+    elif args.command == 'list':
+        jobs = jq.list_jobs(args.status)
+        if args.machine_json:
+            print(json.dumps(jobs, ensure_ascii=False))
+        else:
+            for j in jobs:
+                print(f"{j['id']:>5} {j['status']:<8} p{j['priority']:<3} {j['kind']:<6} {j['vatid']:<14} "
+                      f"attempts={j['attempts']} checkpoint={json.dumps(j['checkpoint'])} {j['error'] or ''}")
@@ -19,15 +19,18 @@ Usage (PowerShell):
 
 If you want machine-readable output for Visual FoxPro, use --machine-json which prints a single-line JSON
 with status, url and body (body is JSON if response Content-Type is application/json, otherwise a truncated text).
+
+Startup cost matters because VFP spawns a new process per operation: heavy modules
+(`requests`, `csv`, `argparse`) are imported inside the functions that use them.
+Run with --profile-startup to print the cold import time of each module.
 """
 
 import os
 import re
 import time
 import json
-import argparse
-import requests
 import auth_manager
+import metrics
 
 
 DEFAULT_API_BZD = os.environ.get('API_BZD', 'https://nikepp.azurewebsites.net/api/')
@@ -42,6 +45,7 @@ DOCUMENT_IDS = []  # e.g. ['abc-123', 'def-456']
 IN_ACCOUNTING_ITEMS = []  # populated by call_in_accounting()
 DEBUG = False
 IN_ACCOUNTING_RESPONSE = None  # full parsed response object (items + paginationKey)
+IN_ACCOUNTING_JSON_PATH = r'C:\temp\in_accounting.json'  # where call_in_accounting() persists the response
 
 
 def apply_placeholders(s: str, vars_map: dict):
@@ -109,46 +113,154 @@ def call_extracted_metadata(vatid=None, timeout=30, vars_map=None):
 
     payload = {'requests': list(document_ids)}
 
-    resp = requests.post(endpoint, headers=headers, json=payload, timeout=timeout)
+    resp = metrics.instrumented_request('POST', endpoint, vatid=vatid, headers=headers, json=payload, timeout=timeout)
 
     return resp
 
 
-def call_in_accounting(vatid=None, payload=None, timeout=30, vars_map=None):
-    """Call the Documents/InAccounting endpoint and store returned items in module variable.
+def fetch_extracted_metadata(document_ids, vatid=None, timeout=30, vars_map=None, max_retries: int = 0):
+    """POST ExtractedMetadata for `document_ids` without touching module state.
 
-    - vatid: company VAT id (defaults to module VATID)
-    - payload: dict to send; if None, uses the default body provided by user
+    Unlike `call_extracted_metadata` this does not read DOCUMENT_IDS, so it is safe
+    to call from several threads. Returns (resp, items). max_retries resends the
+    request on 429/5xx (see `metrics.instrumented_request`).
     """
+    if not isinstance(document_ids, (list, tuple)) or not document_ids:
+        raise ValueError('document_ids must be a non-empty list or tuple of document id strings')
     vatid = vatid or VATID
-    base_url = BASE_URL
-
     vars_map = vars_map or {}
     vars_map.setdefault('api-bzd', DEFAULT_API_BZD)
     vars_map.setdefault('api-bzd-companyvatid', DEFAULT_VATID)
+    endpoint = build_extracted_metadata_endpoint(BASE_URL, vatid, vars_map)
+
+    token = auth_manager.get_access_token()
+    if not token:
+        raise RuntimeError('Não foi possível obter token de acesso')
+    headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': f'Bearer {token}'}
+    resp = metrics.instrumented_request('POST', endpoint, vatid=vatid, headers=headers,
+                                        json={'requests': list(document_ids)}, timeout=timeout,
+                                        max_retries=max_retries)
+    try:
+        data = resp.json()
+    except Exception:
+        data = None
+    return resp, extract_items(data)
+
 
-    # build endpoint
-    resolved = apply_placeholders(base_url, vars_map)
+def build_company_endpoint(base_or_template: str, vatid: str, vars_map: dict, path: str):
+    """Return {base}/Company/{vatid}/{path}, e.g. path 'Documents/InAccounting' or 'AccountingOperations'."""
+    resolved = apply_placeholders(base_or_template, vars_map)
     resolved = resolved.rstrip('/')
     if '/Company/' in resolved:
         endpoint = resolved.replace('{vatId}', vatid).replace('{vatid}', vatid)
-        # ensure path ends with Documents/InAccounting
-        if not endpoint.endswith('/Documents/InAccounting'):
-            endpoint = endpoint.rstrip('/') + '/Documents/InAccounting'
-    else:
-        endpoint = f"{resolved}/Company/{vatid}/Documents/InAccounting"
+        # ensure path ends with the requested endpoint
+        if not endpoint.endswith(f'/{path}'):
+            endpoint = endpoint.rstrip('/') + f'/{path}'
+        return endpoint
+    return f"{resolved}/Company/{vatid}/{path}"
+
+
+def build_documents_search_endpoint(base_or_template: str, vatid: str, vars_map: dict, search: str = 'InAccounting'):
+    """Return the URL of a Documents search endpoint (InAccounting, Accounted, FTE or FTEExported)."""
+    return build_company_endpoint(base_or_template, vatid, vars_map, f'Documents/{search}')
 
+
+def _search_headers(token: str):
     # mirror Postman headers precisely to avoid server-side differences
-    headers = {
+    return {
         'Content-Type': 'application/json; charset=utf-8',
         'Accept': 'application/json; charset=utf-8',
         'Request-Context': 'appId=',
-        'User-Agent': 'PostmanRuntime/7.29.0'
+        'User-Agent': 'PostmanRuntime/7.29.0',
+        'Authorization': f'Bearer {token}'
+    }
+
+
+def extract_items(data):
+    """Return the list of documents in a parsed search response (a list or a dict holding one)."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        # common keys that might contain items
+        for key in ('items', 'results', 'data', 'documents'):
+            if key in data and isinstance(data[key], list):
+                return data[key]
+        # fallback: find first list value in dict
+        for v in data.values():
+            if isinstance(v, list):
+                return v
+    return []
+
+
+def canonicalize_item(it: dict):
+    """Return a document in the canonical shape written to in_accounting.json."""
+    return {
+        "journalGroupName": it.get("journalGroupName", ""),
+        "accountancyYear": it.get("accountancyYear", 0) or 0,
+        "accountancyMonth": it.get("accountancyMonth", 0) or 0,
+        "costCenter": it.get("costCenter", ""),
+        "documentDate": it.get("documentDate", ""),
+        "documentNumber": it.get("documentNumber", ""),
+        "documentVendorVatId": it.get("documentVendorVatId", ""),
+        "documentCustomerVatId": it.get("documentCustomerVatId", ""),
+        "documentTotalAmount": it.get("documentTotalAmount", 0) or 0,
+        "documentStatus": it.get("documentStatus", ""),
+        "updatedOn": it.get("updatedOn", ""),
+        "documentId": it.get("documentId", ""),
+        "createdOn": it.get("createdOn", ""),
+        "documentName": it.get("documentName", "")
     }
+
+
+def search_documents(search: str = 'InAccounting', vatid=None, payload=None, timeout=30, vars_map=None,
+                     parse: bool = True, max_retries: int = 0):
+    """POST one page of a Documents search without touching module state.
+
+    Returns (resp, items, paginationKey). Pass the returned paginationKey in the
+    next payload to fetch the following page. With parse=False the body is left
+    unparsed and (resp, None, None) is returned, so parsing can happen elsewhere.
+    max_retries resends the page on 429/5xx (see `metrics.instrumented_request`).
+    """
+    vatid = vatid or VATID
+    vars_map = vars_map or {}
+    vars_map.setdefault('api-bzd', DEFAULT_API_BZD)
+    vars_map.setdefault('api-bzd-companyvatid', DEFAULT_VATID)
+    endpoint = build_documents_search_endpoint(BASE_URL, vatid, vars_map, search)
+
     token = auth_manager.get_access_token()
     if not token:
         raise RuntimeError('Não foi possível obter token de acesso')
-    headers['Authorization'] = f'Bearer {token}'
+    resp = metrics.instrumented_request('POST', endpoint, vatid=vatid, headers=_search_headers(token),
+                                        json=payload or {}, timeout=timeout, max_retries=max_retries)
+    if not parse:
+        return resp, None, None
+    try:
+        data = resp.json()
+    except Exception:
+        data = None
+    pagination_key = data.get('paginationKey') if isinstance(data, dict) else None
+    return resp, extract_items(data), pagination_key
+
+
+def call_in_accounting(vatid=None, payload=None, timeout=30, vars_map=None):
+    """Call the Documents/InAccounting endpoint and store returned items in module variable.
+
+    - vatid: company VAT id (defaults to module VATID)
+    - payload: dict to send; if None, uses the default body provided by user
+    """
+    vatid = vatid or VATID
+    base_url = BASE_URL
+
+    vars_map = vars_map or {}
+    vars_map.setdefault('api-bzd', DEFAULT_API_BZD)
+    vars_map.setdefault('api-bzd-companyvatid', DEFAULT_VATID)
+
+    endpoint = build_documents_search_endpoint(base_url, vatid, vars_map, 'InAccounting')
+
+    token = auth_manager.get_access_token()
+    if not token:
+        raise RuntimeError('Não foi possível obter token de acesso')
+    headers = _search_headers(token)
 
     if payload is None:
         payload = {
@@ -164,7 +276,7 @@ def call_in_accounting(vatid=None, payload=None, timeout=30, vars_map=None):
             print('URL:', endpoint)
             print('Headers:', json.dumps(headers, ensure_ascii=False))
             print('Payload:', json.dumps(payload, ensure_ascii=False, indent=2))
-        resp = requests.post(endpoint, headers=headers, json=payload, timeout=timeout)
+        resp = metrics.instrumented_request('POST', endpoint, vatid=vatid, headers=headers, json=payload, timeout=timeout)
     except Exception as e:
         print(f'Erro ao executar POST: {e}')
         raise
@@ -181,38 +293,19 @@ def call_in_accounting(vatid=None, payload=None, timeout=30, vars_map=None):
             pass
 
     # try to extract list of items from response JSON
-    items = []
     try:
         data = resp.json()
-        if isinstance(data, list):
-            items = data
-        elif isinstance(data, dict):
-            # common keys that might contain items
-            for key in ('items', 'results', 'data', 'documents'):
-                if key in data and isinstance(data[key], list):
-                    items = data[key]
-                    break
-            else:
-                # fallback: find first list value in dict
-                for v in data.values():
-                    if isinstance(v, list):
-                        items = v
-                        break
     except Exception:
         # response not JSON or parsing failed; keep items empty
-        items = []
+        data = None
+    items = extract_items(data)
 
     # store in module-level variable for later iteration
     global IN_ACCOUNTING_ITEMS
     IN_ACCOUNTING_ITEMS = items
 
     # build canonical response object with items and optional paginationKey
-    pagination_key = None
-    try:
-        if isinstance(data, dict) and 'paginationKey' in data:
-            pagination_key = data.get('paginationKey')
-    except Exception:
-        pagination_key = None
+    pagination_key = data.get('paginationKey') if isinstance(data, dict) else None
 
     response_obj = {
         'items': items,
@@ -225,7 +318,7 @@ def call_in_accounting(vatid=None, payload=None, timeout=30, vars_map=None):
 
     # persist to disk for external processes (e.g., Visual FoxPro) — safe write
     try:
-        save_path = r'C:\temp\in_accounting.json'
+        save_path = IN_ACCOUNTING_JSON_PATH
         save_dir = os.path.dirname(save_path)
         if save_dir and not os.path.exists(save_dir):
             os.makedirs(save_dir, exist_ok=True)
@@ -302,7 +395,7 @@ def export_in_accounting_csv(path: str):
     return path
 
 
-def _print_response(resp: requests.Response, machine_json: bool = False):
+def _print_response(resp, machine_json: bool = False):
     endpoint = getattr(resp.request, 'url', None) or ''
     status = resp.status_code
     ctype = resp.headers.get('Content-Type', '')
@@ -333,6 +426,8 @@ def _print_response(resp: requests.Response, machine_json: bool = False):
 
 
 if __name__ == '__main__':
+    import argparse
+
     parser = argparse.ArgumentParser(description='Call ExtractedMetadata with token check and simple defaults')
     parser.add_argument('--url', default=BASE_URL, help='Base URL or template (default from BASE_URL)')
     parser.add_argument('--vatid', default=VATID, help='Company VAT id (default from VATID)')
@@ -340,8 +435,17 @@ if __name__ == '__main__':
     parser.add_argument('--run-inaccounting', action='store_true', help='Also run the Documents/InAccounting method and store items')
     parser.add_argument('--debug', action='store_true', help='Enable verbose request/response logging for debugging')
     parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON summary (for VFP)')
+    parser.add_argument('--profile-startup', action='store_true', help='Report cold import time per module and exit')
+    parser.add_argument('--metrics-out', help='Write request metrics at exit (.prom = Prometheus text, otherwise JSON Lines)')
+    parser.add_argument('--record', nargs='?', const='recordings/requests.jsonl',
+                        help='Append request/response pairs (secrets masked) to a JSON Lines log for traffic.py replay')
     args = parser.parse_args()
 
+    if args.profile_startup:
+        import startup_profile
+        startup_profile.print_startup_profile(startup_profile.profile_startup(), machine_json=args.machine_json)
+        raise SystemExit(0)
+
     # If CLI provided values, write them to module globals so the function can use them
     if args.url:
         BASE_URL = args.url  # local override for this invocation
@@ -351,6 +455,9 @@ if __name__ == '__main__':
         DOCUMENT_IDS[:] = [i.strip() for i in args.ids.split(',') if i.strip()]
     if args.debug:
         DEBUG = True
+    if args.record:
+        import traffic
+        traffic.start_recording(args.record)
 
     # New behavior: obtain token (if needed) and run only call_in_accounting()
     SAFETY_MARGIN = 60
@@ -388,24 +495,7 @@ if __name__ == '__main__':
     else:
         items = []
 
-    canonical_items = []
-    for it in items:
-        canonical_items.append({
-            "journalGroupName": it.get("journalGroupName", ""),
-            "accountancyYear": it.get("accountancyYear", 0) or 0,
-            "accountancyMonth": it.get("accountancyMonth", 0) or 0,
-            "costCenter": it.get("costCenter", ""),
-            "documentDate": it.get("documentDate", ""),
-            "documentNumber": it.get("documentNumber", ""),
-            "documentVendorVatId": it.get("documentVendorVatId", ""),
-            "documentCustomerVatId": it.get("documentCustomerVatId", ""),
-            "documentTotalAmount": it.get("documentTotalAmount", 0) or 0,
-            "documentStatus": it.get("documentStatus", ""),
-            "updatedOn": it.get("updatedOn", ""),
-            "documentId": it.get("documentId", ""),
-            "createdOn": it.get("createdOn", ""),
-            "documentName": it.get("documentName", "")
-        })
+    canonical_items = [canonicalize_item(it) for it in items]
 
     result = {
         "items": canonical_items,
@@ -413,4 +503,9 @@ if __name__ == '__main__':
     }
 
     print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.metrics_out:
+        metrics.export(args.metrics_out)
+    if args.record:
+        traffic.stop_recording()
 # End of script
\ No newline at end of file
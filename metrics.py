@@ -0,0 +1,368 @@
+"""Request-level instrumentation for every outbound HTTP call.
+
+All call paths send their requests through `instrumented_request`, which wraps
+`requests.request` and records, per request:
+
+- dns_s / connect_s: name resolution and TCP connect time (0 when a pooled
+  connection was reused)
+- ttfb_s: time until the response headers were received (`Response.elapsed`)
+- total_s: wall time including the body download
+- request_bytes / response_bytes, status, retries
+- endpoint (path with VAT id and document ids replaced by placeholders) and vatid
+
+Other events (token refreshes, cache hits) are counted with `record_event`.
+Callables registered with `add_listener` receive (record, response) after every
+request; `traffic` uses this to record request/response pairs.
+
+Records are aggregated into Prometheus-style histograms and counters keyed by
+endpoint and VAT id. They can be exported with `export_prometheus(path)` (text
+exposition format) or `export_jsonl(path)` (one JSON object per request), and
+`endpoint_summary()` returns per-endpoint rows for `pdf_utils` reports.
+
+This module imports `requests`/`urllib3` only when the first request is sent.
+"""
+
+import re
+import json
+import math
+import time
+import socket
+import threading
+from collections import deque
+
+# Histogram bucket upper bounds in seconds (same defaults as the Prometheus clients)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIMING_FIELDS = ('dns_s', 'connect_s', 'ttfb_s', 'total_s')
+MAX_RECORDS = 10000  # raw per-request records kept in memory for JSONL export
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_local = threading.local()
+_records = deque(maxlen=MAX_RECORDS)
+_histograms = {}   # (field, endpoint, vatid) -> {'buckets': [...], 'sum': float, 'count': int}
+_counters = {}     # (name, endpoint, vatid, extra) -> number
+_listeners = []    # callables(record, response_or_None)
+_connection_hook_installed = False
+
+_COMPANY_RE = re.compile(r'/Company/([^/]+)(/.*)?$')
+_GUID_RE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+
+def endpoint_label(url: str):
+    """Return (endpoint, vatid) for `url`, e.g. ('Documents/InAccounting', 'PT504419811').
+
+    Document ids in the path are replaced by '{id}' so labels stay low-cardinality.
+    """
+    path = (url or '').split('?', 1)[0]
+    m = _COMPANY_RE.search(path)
+    if m:
+        endpoint = (m.group(2) or '').strip('/')
+        return _GUID_RE.sub('{id}', endpoint) or '/', m.group(1)
+    path = re.sub(r'^[a-zA-Z]+://[^/]+', '', path)
+    return _GUID_RE.sub('{id}', path.strip('/')) or '/', ''
+
+
+def _install_connection_hook():
+    """Wrap urllib3's create_connection to time DNS resolution and TCP connect separately.
+
+    Installed once per process; the lock keeps concurrent first requests from wrapping it twice.
+    """
+    global _connection_hook_installed
+    if _connection_hook_installed:
+        return
+    with _lock:
+        if _connection_hook_installed:
+            return
+        _wrap_create_connection()
+        _connection_hook_installed = True
+
+
+def _wrap_create_connection():
+    from urllib3.util import connection as urllib3_connection
+
+    original = urllib3_connection.create_connection
+
+    def timed_create_connection(address, *args, **kwargs):
+        timing = getattr(_local, 'timing', None)
+        if timing is None:
+            return original(address, *args, **kwargs)
+        host, port = address
+        t0 = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except OSError:
+            infos = []
+        timing['dns_s'] += time.perf_counter() - t0
+        t1 = time.perf_counter()
+        try:
+            if not infos:
+                return original(address, *args, **kwargs)
+            # connect to the already-resolved addresses so the resolution is not repeated
+            last_error = None
+            for info in infos:
+                try:
+                    return original((info[4][0], port), *args, **kwargs)
+                except OSError as e:
+                    last_error = e
+            raise last_error
+        finally:
+            timing['connect_s'] += time.perf_counter() - t1
+
+    urllib3_connection.create_connection = timed_create_connection
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0
+
+
+def _observe(field, endpoint, vatid, value):
+    key = (field, endpoint, vatid)
+    h = _histograms.get(key)
+    if h is None:
+        h = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            h['buckets'][i] += 1
+    h['sum'] += value
+    h['count'] += 1
+
+
+def _inc(name, endpoint, vatid, amount=1, extra=''):
+    key = (name, endpoint, vatid, extra)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def record(rec: dict):
+    """Aggregate one request record (as produced by `instrumented_request`)."""
+    endpoint, vatid = rec['endpoint'], rec['vatid']
+    with _lock:
+        _records.append(rec)
+        for field in TIMING_FIELDS:
+            _observe(field, endpoint, vatid, rec.get(field) or 0.0)
+        _inc('requests', endpoint, vatid, extra=str(rec.get('status')))
+        _inc('request_bytes', endpoint, vatid, rec.get('request_bytes') or 0)
+        _inc('response_bytes', endpoint, vatid, rec.get('response_bytes') or 0)
+        _inc('retries', endpoint, vatid, rec.get('retries') or 0)
+
+
+def add_listener(fn):
+    """Call `fn(record, response)` after every instrumented request (response is None on exceptions)."""
+    with _lock:
+        if fn not in _listeners:
+            _listeners.append(fn)
+
+
+def remove_listener(fn):
+    with _lock:
+        if fn in _listeners:
+            _listeners.remove(fn)
+
+
+def _notify(rec, resp):
+    with _lock:
+        listeners = list(_listeners)
+    for fn in listeners:
+        try:
+            fn(rec, resp)
+        except Exception:
+            # a broken listener must never fail the request itself
+            pass
+
+
+def record_event(name: str, endpoint: str = '', vatid: str = '', amount: int = 1):
+    """Count an event that is not an HTTP request, e.g. 'token_refresh' or 'cache_hit'."""
+    with _lock:
+        _inc(name, endpoint, vatid, amount)
+
+
+def instrumented_request(method: str, url: str, vatid: str = None, endpoint: str = None,
+                         max_retries: int = 0, retry_statuses=RETRY_STATUSES, **kwargs):
+    """Send a request with `requests.request` and record its timing. Returns the Response.
+
+    - vatid / endpoint: labels; derived from the URL when omitted
+    - max_retries: resend on 429/5xx (honouring Retry-After) up to this many times;
+      the default 0 keeps the single-attempt behaviour of the callers
+    - retry_statuses: statuses that are resent (narrow it for non-idempotent requests)
+    - kwargs: passed to `requests.request` (headers, json, data, timeout, auth, ...)
+    """
+    import requests
+
+    _install_connection_hook()
+    url_endpoint, url_vatid = endpoint_label(url)
+    endpoint = endpoint or url_endpoint
+    vatid = vatid if vatid is not None else url_vatid
+
+    timing = {'dns_s': 0.0, 'connect_s': 0.0}
+    retries = 0
+    start = time.perf_counter()
+    _local.timing = timing
+    try:
+        while True:
+            try:
+                resp = requests.request(method, url, **kwargs)
+            except Exception as e:
+                rec = {
+                    'ts': time.time(), 'method': method, 'url': url, 'endpoint': endpoint, 'vatid': vatid,
+                    'status': 'error', 'error': str(e), 'retries': retries,
+                    'dns_s': timing['dns_s'], 'connect_s': timing['connect_s'], 'ttfb_s': 0.0,
+                    'total_s': time.perf_counter() - start, 'request_bytes': 0, 'response_bytes': 0
+                }
+                record(rec)
+                _notify(rec, None)
+                raise
+            if resp.status_code not in retry_statuses or retries >= max_retries:
+                break
+            retries += 1
+            retry_after = resp.headers.get('Retry-After')
+            try:
+                delay = float(retry_after) if retry_after else 0.5 * retries
+            except ValueError:
+                delay = 0.5 * retries
+            time.sleep(min(delay, 30.0))
+    finally:
+        _local.timing = None
+
+    total = time.perf_counter() - start
+    rec = {
+        'ts': time.time(),
+        'method': method,
+        'url': url,
+        'endpoint': endpoint,
+        'vatid': vatid,
+        'status': resp.status_code,
+        'retries': retries,
+        'dns_s': timing['dns_s'],
+        'connect_s': timing['connect_s'],
+        'ttfb_s': resp.elapsed.total_seconds() if resp.elapsed else 0.0,
+        'total_s': total,
+        'request_bytes': _body_size(getattr(resp.request, 'body', None)),
+        'response_bytes': len(resp.content or b''),
+    }
+    record(rec)
+    _notify(rec, resp)
+    return resp
+
+
+def get_records():
+    """Return a copy of the raw per-request records kept in memory."""
+    with _lock:
+        return list(_records)
+
+
+def reset():
+    """Forget all records, histograms and counters."""
+    with _lock:
+        _records.clear()
+        _histograms.clear()
+        _counters.clear()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100.0) - 1))
+    return ordered[k]
+
+
+def _histogram_quantile(h, q):
+    """Estimate quantile `q` from bucket counts (upper bound of the bucket that contains it)."""
+    if not h['count']:
+        return 0.0
+    target = q * h['count']
+    for i, bound in enumerate(BUCKETS):
+        if h['buckets'][i] >= target:
+            return bound
+    return float('inf')
+
+
+def endpoint_summary():
+    """Per endpoint/VAT id rows for reports.
+
+    Each row: endpoint, vatid, requests, errors, retries, p50_ms, p99_ms (bucket
+    upper bounds), avg_ms, request_bytes, response_bytes.
+    """
+    with _lock:
+        rows = {}
+        for (name, endpoint, vatid, extra), value in _counters.items():
+            row = rows.setdefault((endpoint, vatid), {
+                'endpoint': endpoint, 'vatid': vatid, 'requests': 0, 'errors': 0, 'retries': 0,
+                'request_bytes': 0, 'response_bytes': 0
+            })
+            if name == 'requests':
+                row['requests'] += value
+                if not extra.isdigit() or int(extra) >= 400:
+                    row['errors'] += value
+            elif name in ('retries', 'request_bytes', 'response_bytes'):
+                row[name] += value
+            else:
+                row[name] = row.get(name, 0) + value
+        for (endpoint, vatid), row in rows.items():
+            h = _histograms.get(('total_s', endpoint, vatid))
+            if h and h['count']:
+                row['p50_ms'] = round(_histogram_quantile(h, 0.5) * 1000, 1)
+                row['p99_ms'] = round(_histogram_quantile(h, 0.99) * 1000, 1)
+                row['avg_ms'] = round(h['sum'] / h['count'] * 1000, 1)
+        return sorted(rows.values(), key=lambda r: (r['endpoint'], r['vatid']))
+
+
+def _labels(endpoint, vatid, **extra):
+    parts = [f'endpoint="{endpoint}"', f'vatid="{vatid}"'] + [f'{k}="{v}"' for k, v in extra.items()]
+    return '{' + ','.join(parts) + '}'
+
+
+def prometheus_text():
+    """Render all histograms and counters in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for field in TIMING_FIELDS:
+            name = f"bizdocs_request_{field[:-2]}_seconds"
+            series = [(k, h) for k, h in _histograms.items() if k[0] == field]
+            if not series:
+                continue
+            lines.append(f'# TYPE {name} histogram')
+            for (_, endpoint, vatid), h in sorted(series, key=lambda s: s[0]):
+                for bound, count in zip(BUCKETS, h['buckets']):
+                    lines.append(f'{name}_bucket{_labels(endpoint, vatid, le=bound)} {count}')
+                lines.append(f'{name}_bucket{_labels(endpoint, vatid, le="+Inf")} {h["count"]}')
+                lines.append(f'{name}_sum{_labels(endpoint, vatid)} {h["sum"]:.6f}')
+                lines.append(f'{name}_count{_labels(endpoint, vatid)} {h["count"]}')
+        by_name = {}
+        for (name, endpoint, vatid, extra), value in _counters.items():
+            by_name.setdefault(name, []).append((endpoint, vatid, extra, value))
+        for name in sorted(by_name):
+            metric = f'bizdocs_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for endpoint, vatid, extra, value in sorted(by_name[name], key=lambda s: s[:3]):
+                labels = _labels(endpoint, vatid, status=extra) if name == 'requests' else _labels(endpoint, vatid)
+                lines.append(f'{metric}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def export_prometheus(path: str):
+    """Write `prometheus_text()` to `path` (e.g. for the node_exporter textfile collector). Returns the path."""
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(prometheus_text())
+    return path
+
+
+def export_jsonl(path: str, append: bool = True):
+    """Write the raw per-request records to `path` as JSON Lines. Returns the path."""
+    with open(path, 'a' if append else 'w', encoding='utf-8') as fh:
+        for rec in get_records():
+            fh.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    return path
+
+
+def export(path: str):
+    """Export by file extension: `.prom`/`.txt` -> Prometheus text, anything else -> JSON Lines."""
+    if path.lower().endswith(('.prom', '.txt')):
+        return export_prometheus(path)
+    return export_jsonl(path)
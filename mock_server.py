@@ -0,0 +1,443 @@
+"""Local stand-in for the BizDocs API and identity server.
+
+Implements the endpoints used by this integration so throughput and latency can
+be measured without touching `nikepp.azurewebsites.net`:
+
+  POST /identity/connect/token                                  (password grant)
+  POST /api/Company/{vatId}/Documents/InAccounting              (paginated)
+  POST /api/Company/{vatId}/Documents/Accounted                 (paginated)
+  POST /api/Company/{vatId}/Documents/FTE                       (paginated)
+  POST /api/Company/{vatId}/Documents/FTEExported               (paginated)
+  POST /api/Company/{vatId}/Documents/ExtractedMetadata
+  POST /api/Company/{vatId}/Documents/Match/FullMatch[/ByATCUD]
+  POST /api/Company/{vatId}/Documents/Match/PartialMatch
+  POST|PUT|DELETE /api/Company/{vatId}/AccountingOperations
+  GET  /api/Company/{vatId}/Document/{documentId}/Related
+
+Documents are generated deterministically per VAT id, so two runs with the same
+configuration return the same data. Latency, page size, error rate and 429
+throttling are configurable (see DEFAULT_CONFIG).
+
+Usage:
+  python mock_server.py --port 8085 --docs 5000 --page-size 100 --latency-ms 40
+  set API_BZD=http://127.0.0.1:8085/api/
+  set API_BZD_IDENTITY=http://127.0.0.1:8085/identity/connect/token
+  python main.py --run-inaccounting
+
+Or in-process:
+  server = MockBizDocsServer(docs=1000).start()
+  ...  # server.api_url / server.token_url
+  server.stop()
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONFIG = {
+    'docs': 1000,              # documents generated per company
+    'page_size': 100,          # items per page on the search endpoints
+    'latency_ms': 0,           # fixed latency added to every response
+    'jitter_ms': 0,            # random extra latency in [0, jitter_ms]
+    'error_rate': 0.0,         # probability of answering 500 to an API call
+    'rate_limit': 0,           # max API requests per second before answering 429 (0 = unlimited)
+    'token_ttl': 300,          # expires_in returned by the identity endpoint
+    'seed': 42,                # base seed for document generation
+}
+
+STATUSES = ['accountvalidation', 'manualentry', 'automaticentry']
+SEARCH_ENDPOINTS = ('InAccounting', 'Accounted', 'FTE', 'FTEExported')
+
+_COMPANY_RE = re.compile(r'^/api/Company/([^/]+)/(.+)$')
+
+
+def _generate_documents(vatid: str, count: int, seed: int):
+    """Return `count` deterministic documents for `vatid` in the InAccounting shape."""
+    rnd = random.Random(f'{seed}:{vatid}')
+    docs = []
+    for i in range(count):
+        year = 2024 + (i % 2)
+        month = 1 + (i % 12)
+        day = 1 + (i % 28)
+        created = f'{year}-{month:02d}-{day:02d}T{i % 24:02d}:{i % 60:02d}:00.000Z'
+        docs.append({
+            'journalGroupName': rnd.choice(['Compras', 'Vendas', 'Diversos']),
+            'accountancyYear': year,
+            'accountancyMonth': month,
+            'costCenter': rnd.choice(['', 'CC01', 'CC02']),
+            'documentDate': f'{year}-{month:02d}-{day:02d}',
+            'documentNumber': f'FT {year}/{i + 1}',
+            'documentVendorVatId': f'PT5{rnd.randint(10000000, 99999999)}',
+            'documentCustomerVatId': vatid,
+            'documentTotalAmount': round(rnd.uniform(1, 10000), 2),
+            'documentStatus': STATUSES[i % len(STATUSES)],
+            'updatedOn': created,
+            'documentId': str(uuid.UUID(int=rnd.getrandbits(128))),
+            'createdOn': created,
+            'documentCreatedOn': created,
+            'documentName': f'doc_{i + 1}.pdf',
+        })
+    return docs
+
+
+def _endpoint_view(endpoint: str, doc: dict, index: int):
+    """Project a generated document onto the shape returned by a search endpoint, or None to skip it."""
+    if endpoint == 'InAccounting':
+        return doc
+    if endpoint == 'Accounted':
+        if index % 3:
+            return None
+        out = {k: v for k, v in doc.items() if k not in ('journalGroupName', 'accountancyYear', 'accountancyMonth')}
+        out.update({
+            'documentStatus': 'accounted',
+            'accountedTimeStamp': doc['updatedOn'],
+            'accountedDate': doc['documentDate'],
+            'accountedNumber': f"{doc['documentDate']} 1 {index:06d}",
+            'accountedJournalCode': '1',
+            'accountedJournalName': doc['journalGroupName'],
+        })
+        return out
+    if endpoint == 'FTE':
+        return dict(doc, documentStatus='fte') if index % 2 == 0 else None
+    if endpoint == 'FTEExported':
+        return dict(doc, documentStatus='fteexported') if index % 4 == 0 else None
+    return None
+
+
+class _MockState:
+    """Shared mutable state of a running mock server (documents, tokens, counters)."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.lock = threading.Lock()
+        self.companies = {}
+        self.tokens = set()
+        self.window_start = 0.0
+        self.window_count = 0
+        self.counters = {'requests': 0, 'throttled': 0, 'errors': 0, 'tokens': 0}
+        self.rnd = random.Random(config['seed'])
+
+    def documents(self, vatid: str):
+        with self.lock:
+            if vatid not in self.companies:
+                self.companies[vatid] = _generate_documents(vatid, self.config['docs'], self.config['seed'])
+            return self.companies[vatid]
+
+    def throttled(self):
+        """Fixed one-second window rate limiter; returns True when the request must get a 429."""
+        limit = self.config['rate_limit']
+        if not limit:
+            return False
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= 1.0:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count > limit
+
+    def count(self, key: str):
+        with self.lock:
+            self.counters[key] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        # keep benchmark output clean; enable with --verbose
+        if getattr(self.server, 'verbose', False):
+            super().log_message(fmt, *args)
+
+    # --- helpers ---
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _read_json(self):
+        raw = self._read_body()
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw.decode('utf-8'))
+        except Exception:
+            return None
+
+    def _send(self, status: int, body=None, headers: dict = None):
+        payload = b''
+        if body is not None:
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def _delay(self):
+        cfg = self.server.state.config
+        delay = cfg['latency_ms'] + (self.server.state.rnd.uniform(0, cfg['jitter_ms']) if cfg['jitter_ms'] else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    # --- dispatch ---
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method: str):
+        state = self.server.state
+        state.count('requests')
+        path = self.path.split('?', 1)[0].rstrip('/')
+        self._delay()
+
+        if path == '/identity/connect/token' and method == 'POST':
+            return self._token()
+
+        m = _COMPANY_RE.match(path)
+        if not m:
+            self._read_body()
+            return self._send(404, {'error': f'Unknown path {path}'})
+
+        if not (self.headers.get('Authorization') or '').startswith('Bearer '):
+            self._read_body()
+            return self._send(401, {'error': 'Missing bearer token'})
+        token = self.headers['Authorization'][len('Bearer '):]
+        if token not in state.tokens:
+            self._read_body()
+            return self._send(401, {'error': 'Invalid or expired token'})
+
+        if state.throttled():
+            self._read_body()
+            state.count('throttled')
+            return self._send(429, {'error': 'Too many requests'}, headers={'Retry-After': '1'})
+        if state.config['error_rate'] and state.rnd.random() < state.config['error_rate']:
+            self._read_body()
+            state.count('errors')
+            return self._send(500, {'error': 'Simulated server error'})
+
+        vatid, rest = m.group(1), m.group(2)
+        body = self._read_json() if method != 'GET' else {}
+        if body is None:
+            return self._send(400, {'error': 'Invalid JSON body'})
+
+        parts = rest.split('/')
+        if method == 'POST' and len(parts) == 2 and parts[0] == 'Documents' and parts[1] in SEARCH_ENDPOINTS:
+            return self._search(vatid, parts[1], body)
+        if method == 'POST' and rest == 'Documents/ExtractedMetadata':
+            return self._extracted_metadata(vatid, body)
+        if method == 'POST' and rest.startswith('Documents/Match/'):
+            return self._match(vatid, rest[len('Documents/Match/'):], body)
+        if rest == 'AccountingOperations' and method in ('POST', 'PUT', 'DELETE'):
+            return self._accounting(vatid, method, body)
+        if method == 'GET' and len(parts) == 3 and parts[0] == 'Document' and parts[2] == 'Related':
+            return self._related(vatid, parts[1])
+        return self._send(404, {'error': f'Unknown endpoint {method} {rest}'})
+
+    # --- endpoints ---
+    def _token(self):
+        state = self.server.state
+        raw = self._read_body().decode('utf-8', errors='replace')
+        if not (self.headers.get('Authorization') or '').startswith('Basic ') or 'grant_type=password' not in raw:
+            return self._send(400, {'error': 'invalid_request'})
+        token = uuid.uuid4().hex
+        with state.lock:
+            state.tokens.add(token)
+        state.count('tokens')
+        self._send(200, {
+            'access_token': token,
+            'expires_in': state.config['token_ttl'],
+            'token_type': 'Bearer',
+            'scope': 'api1 api2'
+        })
+
+    def _search(self, vatid: str, endpoint: str, body: dict):
+        cfg = self.server.state.config
+        statuses = body.get('documentStatus') if endpoint == 'InAccounting' else None
+        matching = []
+        for i, doc in enumerate(self.server.state.documents(vatid)):
+            view = _endpoint_view(endpoint, doc, i)
+            if view is None or (statuses and view.get('documentStatus') not in statuses):
+                continue
+            matching.append(view)
+
+        offset = 0
+        key = body.get('paginationKey')
+        if key:
+            try:
+                offset = int(str(key).split('|', 1)[0])
+            except ValueError:
+                return self._send(400, {'error': f'Invalid paginationKey {key}'})
+        page = matching[offset:offset + cfg['page_size']]
+        next_offset = offset + len(page)
+        next_key = None
+        if next_offset < len(matching):
+            next_key = f"{next_offset}|{page[-1]['updatedOn']}"
+        self._send(200, {'items': page, 'paginationKey': next_key})
+
+    def _extracted_metadata(self, vatid: str, body: dict):
+        ids = body.get('requests') or body.get('documentIds') or []
+        by_id = {d['documentId']: d for d in self.server.state.documents(vatid)}
+        items = []
+        for doc_id in ids:
+            doc = by_id.get(doc_id)
+            if doc is None:
+                continue
+            items.append({
+                'documentId': doc_id,
+                'documentType': 'FT',
+                'costCenter': doc['costCenter'],
+                'updatedOn': doc['updatedOn'],
+                'fields': [
+                    {'name': 'invoiceNumber', 'type': 'string', 'value': doc['documentNumber']},
+                    {'name': 'invoiceDate', 'type': 'date', 'value': doc['documentDate']},
+                    {'name': 'vatid', 'type': 'string', 'value': doc['documentVendorVatId']},
+                    {'name': 'total', 'type': 'decimal', 'value': str(doc['documentTotalAmount'])},
+                ]
+            })
+        self._send(200, {'items': items})
+
+    def _match(self, vatid: str, kind: str, body: dict):
+        docs = self.server.state.documents(vatid)
+        items = []
+        for req in body.get('requests') or []:
+            found = None
+            if kind == 'FullMatch/ByATCUD':
+                found = None  # generated documents carry no ATCUD
+            else:
+                for d in docs:
+                    if d['documentNumber'] == req.get('documentNumber') and (
+                            kind == 'PartialMatch' or d['documentVendorVatId'] == req.get('supplierVatId')):
+                        found = d
+                        break
+            items.append({'request': req, 'matched': found is not None,
+                          'documentId': found['documentId'] if found else None})
+        self._send(200, {'items': items})
+
+    def _accounting(self, vatid: str, method: str, body: dict):
+        docs = self.server.state.documents(vatid)
+        by_id = {d['documentId']: d for d in docs}
+        requests_list = body.get('requests') if method == 'POST' else [body]
+        errors = []
+        with self.server.state.lock:
+            for req in requests_list or []:
+                doc = by_id.get((req or {}).get('documentId'))
+                if doc is None:
+                    errors.append({'documentId': (req or {}).get('documentId'), 'errorMessage': 'Document not found'})
+                    continue
+                if method == 'DELETE':
+                    doc['documentStatus'] = 'manualentry'
+                else:
+                    doc['documentStatus'] = 'accounted'
+                doc['updatedOn'] = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        self._send(200, {'success': not errors, 'errors': errors})
+
+    def _related(self, vatid: str, document_id: str):
+        docs = self.server.state.documents(vatid)
+        idx = next((i for i, d in enumerate(docs) if d['documentId'] == document_id), None)
+        if idx is None:
+            return self._send(404, {'error': 'Document not found'})
+        items = []
+        for j in (idx - 1, idx + 1):
+            if 0 <= j < len(docs):
+                d = docs[j]
+                items.append({
+                    'documentId': d['documentId'],
+                    'documentName': d['documentName'],
+                    'documentCreatedOn': d['documentCreatedOn'],
+                    'documentStatus': d['documentStatus'],
+                    'relationCreatedOn': d['createdOn'],
+                    'relationType': 'related',
+                    'relationComment': ''
+                })
+        self._send(200, {'items': items})
+
+
+class MockBizDocsServer:
+    """Run the mock API in a background thread. Keyword arguments override DEFAULT_CONFIG."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, verbose: bool = False, **config):
+        unknown = set(config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f'Unknown mock config keys: {", ".join(sorted(unknown))}')
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = _MockState(self.config)
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return f'{self.base_url}/api/'
+
+    @property
+    def token_url(self):
+        return f'{self.base_url}/identity/connect/token'
+
+    @property
+    def counters(self):
+        return dict(self.httpd.state.counters)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local stand-in for the BizDocs API and identity server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--docs', type=int, default=DEFAULT_CONFIG['docs'], help='Documents per company')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_CONFIG['page_size'])
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_CONFIG['latency_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_CONFIG['jitter_ms'])
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_CONFIG['error_rate'], help='0.0 - 1.0')
+    parser.add_argument('--rate-limit', type=int, default=DEFAULT_CONFIG['rate_limit'], help='Requests/sec before 429')
+    parser.add_argument('--token-ttl', type=int, default=DEFAULT_CONFIG['token_ttl'])
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG['seed'])
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    server = MockBizDocsServer(
+        host=args.host, port=args.port, verbose=args.verbose,
+        docs=args.docs, page_size=args.page_size, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, token_ttl=args.token_ttl, seed=args.seed
+    )
+    print(f'Mock BizDocs API at {server.api_url}')
+    print(f'Token endpoint at {server.token_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -1,12 +1,9 @@
 """Utilitários para gerar um relatório PDF simples com metadados, pedido e resposta.
 
-Dependência: reportlab
+Dependência: reportlab (importado apenas quando um relatório é gerado, para que
+importar este módulo não atrase o arranque dos CLIs).
 """
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
 import textwrap
 
 
@@ -25,13 +22,19 @@ def _draw_wrapped_text(c, x, y, text, max_width, leading=12):
     return y
 
 
-def generate_api_report_pdf(path, metadata, request_info, response_info, notes=None):
+def generate_api_report_pdf(path, metadata, request_info, response_info, notes=None, endpoint_metrics=None):
     """Gera um PDF com estrutura:
     - Cabeçalho e metadados
     - Request (headers e resumo do body)
-    - Response (status, tipo detectado, summary, artifact se houver)
+    - Response (status, tipo detectado, summary, latência/tamanho se houver, artifact se houver)
+    - Endpoint metrics (opcional: linhas de `metrics.endpoint_summary()`)
     - Notes/observações
     """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+
     c = canvas.Canvas(path, pagesize=A4)
     width, height = A4
     margin = 20 * mm
@@ -86,11 +89,31 @@ def generate_api_report_pdf(path, metadata, request_info, response_info, notes=N
         y = _draw_wrapped_text(c, x, y, line, max_width=width - 2*margin)
         y -= 6
 
+    if response_info.get('latency_ms') is not None:
+        c.drawString(x, y, f"Latency: {response_info.get('latency_ms')} ms")
+        y -= 12
+    if response_info.get('payload_bytes') is not None:
+        c.drawString(x, y, f"Payload size: {response_info.get('payload_bytes')} bytes")
+        y -= 12
+
     artifact = response_info.get('artifact')
     if artifact:
         c.drawString(x, y, f"Artifact: {artifact}")
         y -= 12
 
+    if endpoint_metrics:
+        y -= 8
+        c.setFont('Helvetica-Bold', 12)
+        c.drawString(x, y, 'Endpoint metrics')
+        y -= 14
+        c.setFont('Helvetica', 9)
+        for row in endpoint_metrics:
+            line = (f"{row.get('endpoint')} [{row.get('vatid') or '-'}]: {row.get('requests')} req, "
+                    f"{row.get('errors')} err, {row.get('retries')} retries, p50 {row.get('p50_ms', '-')} ms, "
+                    f"p99 {row.get('p99_ms', '-')} ms, {row.get('response_bytes')} bytes in")
+            y = _draw_wrapped_text(c, x, y, line, max_width=width - 2*margin)
+            y -= 2
+
     if notes:
         y -= 6
         c.setFont('Helvetica-Bold', 11)
@@ -0,0 +1,291 @@
+"""Multi-company sync with I/O on threads and CPU-bound stages on a process pool.
+
+Parsing large bodies, canonicalising items, running `response_processors` and
+rendering PDFs with `pdf_utils` used to run on the same thread that issues the
+HTTP calls, stalling the network under load. Here:
+
+- I/O stage: one thread per company (up to `io_workers`) follows the search
+  pagination. It only peeks the paginationKey out of the raw body and hands the
+  bytes on; it never parses the full page.
+- CPU stage (`CpuStage`): a process pool (`cpu_workers`, default: all cores)
+  parses and canonicalises each page, runs `response_processors` on bodies that
+  are not JSON search pages (PDF, XML, CSV, ... exports), and optionally renders
+  one PDF report per company. At most `max_inflight` tasks are queued; when the pool falls behind
+  the I/O threads block in `submit` (backpressure) instead of piling bodies up
+  in memory.
+
+Stage functions are module-level so they can be pickled to worker processes.
+
+Usage:
+  python pipeline.py --vatids PT504419811,PT500000000 --io-workers 8 --cpu-workers 4
+  python pipeline.py --vatids PT504419811 --report-dir reports --machine-json
+"""
+
+import os
+import json
+import time
+import threading
+
+import main
+
+PAGINATION_KEY_MARKER = b'"paginationKey"'
+MAX_RETRIES = 5  # resends per page on 429/5xx (throttling is expected with many companies)
+
+
+# --- CPU stage functions (run in worker processes) ---
+
+def canonicalize_page(content: bytes):
+    """Parse a raw search page and return its items in the canonical shape."""
+    try:
+        data = json.loads(content.decode('utf-8'))
+    except Exception:
+        return []
+    return [main.canonicalize_item(it) for it in main.extract_items(data) if isinstance(it, dict)]
+
+
+class _RawResponse:
+    """Minimal response object (headers + content) accepted by `response_processors.process_response`."""
+
+    def __init__(self, headers, content):
+        self.headers = headers
+        self.content = content
+
+
+def process_body(headers: dict, content: bytes):
+    """Run `response_processors.process_response` on a raw body (for use in a worker process)."""
+    import response_processors
+    return response_processors.process_response(_RawResponse(dict(headers or {}), content))
+
+
+def render_report(path: str, metadata: dict, request_info: dict, response_info: dict, notes: str = None,
+                  endpoint_metrics=None):
+    """Render a `pdf_utils` report in a worker process. Returns the path."""
+    import pdf_utils
+    pdf_utils.generate_api_report_pdf(path, metadata, request_info, response_info, notes=notes,
+                                      endpoint_metrics=endpoint_metrics)
+    return path
+
+
+def peek_pagination_key(content: bytes):
+    """Read paginationKey from a raw JSON body without parsing the whole document.
+
+    Fast path: the API writes paginationKey as the last key of the top-level
+    object, so the last marker is only trusted when its value is followed by
+    nothing but the closing '}' (an item field would be followed by '}]...').
+    Anything else (key before items, trailing fields) falls back to a full parse.
+    """
+    pos = content.rfind(PAGINATION_KEY_MARKER)
+    if pos >= 0:
+        colon = content.find(b':', pos + len(PAGINATION_KEY_MARKER))
+        tail = content[colon + 1:] if colon >= 0 else b''
+        if 0 < len(tail) <= 4096:
+            try:
+                text = tail.decode('utf-8')
+                stripped = text.lstrip()
+                value, end = json.JSONDecoder().raw_decode(stripped)
+                if stripped[end:].strip() == '}':
+                    return value
+            except ValueError:
+                pass
+    try:
+        data = json.loads(content.decode('utf-8'))
+    except Exception:
+        return None
+    return data.get('paginationKey') if isinstance(data, dict) else None
+
+
+class CpuStage:
+    """Bounded front-end to a process pool: `submit` blocks while `max_inflight` tasks are pending.
+
+    cpu_workers=0 runs tasks inline (useful for debugging); use_processes=False
+    uses threads instead of processes.
+    """
+
+    def __init__(self, cpu_workers: int = None, max_inflight: int = None, use_processes: bool = True):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        self.cpu_workers = (os.cpu_count() or 1) if cpu_workers is None else cpu_workers
+        self.max_inflight = max_inflight or max(2, 2 * max(1, self.cpu_workers))
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self.blocked_s = 0.0   # total time producers waited for a free slot
+        self._lock = threading.Lock()
+        if self.cpu_workers <= 0:
+            self._executor = None
+        elif use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.cpu_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args) on the pool and return a Future; blocks while the stage is full."""
+        from concurrent.futures import Future
+
+        t0 = time.perf_counter()
+        self._slots.acquire()
+        waited = time.perf_counter() - t0
+        with self._lock:
+            self.blocked_s += waited
+        if self._executor is None:
+            fut = Future()
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                fut.set_exception(e)
+            finally:
+                self._slots.release()
+            return fut
+        try:
+            fut = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+        return fut
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _sync_company(vatid, search, payload, cpu: CpuStage, result: dict, timeout: int, max_retries: int):
+    """I/O stage for one company: fetch pages and hand each raw body to the CPU stage."""
+    body = dict(payload)
+    body.pop('paginationKey', None)
+    start = time.perf_counter()
+    try:
+        while True:
+            resp, _, _ = main.search_documents(search, vatid=vatid, payload=body, timeout=timeout, parse=False,
+                                               max_retries=max_retries)
+            result['pages'] += 1
+            result['bytes'] += len(resp.content or b'')
+            if resp.status_code >= 400:
+                result['error'] = f'{search} HTTP {resp.status_code}'
+                break
+            content_type = (resp.headers.get('Content-Type') or '').lower()
+            if content_type and 'json' not in content_type:
+                # not a search page (e.g. a file export): response_processors handles it in the pool
+                result['futures'].append(('processed', cpu.submit(process_body, dict(resp.headers), resp.content)))
+                break
+            result['futures'].append(('items', cpu.submit(canonicalize_page, resp.content)))
+            key = peek_pagination_key(resp.content)
+            if not key or key == body.get('paginationKey'):
+                break
+            body['paginationKey'] = key
+    except Exception as e:
+        result['error'] = str(e)
+    result['io_elapsed_s'] = round(time.perf_counter() - start, 4)
+
+
+def sync_companies(vatids, search: str = 'InAccounting', payload: dict = None, io_workers: int = 4,
+                   cpu_workers: int = None, max_inflight: int = None, report_dir: str = None,
+                   use_processes: bool = True, timeout: int = 30, max_retries: int = MAX_RETRIES):
+    """Sync `search` for every VAT id in `vatids` and return {vatid: result}.
+
+    Each result holds items (canonical), processed (`response_processors` results for
+    non-JSON bodies), pages, bytes, io_elapsed_s, error and, when report_dir is
+    given, report (PDF path rendered in the pool). The special
+    key '_stats' holds elapsed_s, cpu_workers and cpu_blocked_s (time the I/O
+    threads spent waiting on the CPU stage).
+    """
+    import auth_manager
+    from concurrent.futures import ThreadPoolExecutor
+
+    if payload is None:
+        payload = {'documentStatus': ['accountvalidation', 'manualentry']} if search == 'InAccounting' else {}
+    # fetch the token once so the I/O threads don't all refresh it at the same time
+    if not auth_manager.get_access_token():
+        raise RuntimeError('Não foi possível obter token de acesso')
+
+    results = {v: {'items': [], 'processed': [], 'pages': 0, 'bytes': 0, 'error': None, 'futures': []}
+               for v in vatids}
+    start = time.perf_counter()
+    with CpuStage(cpu_workers, max_inflight, use_processes) as cpu:
+        with ThreadPoolExecutor(max_workers=max(1, io_workers)) as io_pool:
+            for v in vatids:
+                io_pool.submit(_sync_company, v, search, payload, cpu, results[v], timeout, max_retries)
+
+        report_futures = {}
+        for v, r in results.items():
+            for kind, fut in r.pop('futures'):
+                try:
+                    if kind == 'items':
+                        r['items'].extend(fut.result())
+                    else:
+                        r['processed'].append(fut.result())
+                except Exception as e:
+                    r['error'] = r['error'] or f'{kind} stage failed: {e}'
+            if report_dir:
+                os.makedirs(report_dir, exist_ok=True)
+                path = os.path.join(report_dir, f'sync_{v}_{search}_{int(time.time())}.pdf')
+                report_futures[v] = cpu.submit(
+                    render_report, path,
+                    {'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'api_endpoint': f'Documents/{search}',
+                     'method': 'POST'},
+                    {'body_summary': json.dumps(payload, ensure_ascii=False)},
+                    {'status_code': 'error' if r['error'] else 200, 'detected_type': 'json',
+                     'summary': f"{len(r['items'])} items in {r['pages']} pages for {v}",
+                     'payload_bytes': r['bytes'], 'latency_ms': round(r.get('io_elapsed_s', 0) * 1000, 1)},
+                    r['error'])
+        for v, fut in report_futures.items():
+            try:
+                results[v]['report'] = fut.result()
+            except Exception as e:
+                results[v]['report'] = None
+                results[v]['error'] = results[v]['error'] or f'report failed: {e}'
+        blocked = cpu.blocked_s
+        workers = cpu.cpu_workers
+
+    results['_stats'] = {
+        'elapsed_s': round(time.perf_counter() - start, 4),
+        'cpu_workers': workers,
+        'cpu_blocked_s': round(blocked, 4),
+    }
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sync many companies with a process-pool CPU stage')
+    parser.add_argument('--url', default=main.BASE_URL, help='Base URL or template (default from main.BASE_URL)')
+    parser.add_argument('--vatids', default=main.VATID, help='Comma-separated company VAT ids')
+    parser.add_argument('--search', default='InAccounting', help='InAccounting, Accounted, FTE or FTEExported')
+    parser.add_argument('--io-workers', type=int, default=4, help='Concurrent HTTP threads')
+    parser.add_argument('--cpu-workers', type=int, default=None, help='Worker processes (default: all cores, 0 = inline)')
+    parser.add_argument('--max-inflight', type=int, default=None, help='Max queued CPU tasks before I/O blocks')
+    parser.add_argument('--report-dir', help='Render one PDF report per company into this folder')
+    parser.add_argument('--output', help='Write {vatid: items} as JSON to this path')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON summary (for VFP)')
+    args = parser.parse_args()
+
+    main.BASE_URL = args.url
+    vatids = [v.strip() for v in args.vatids.split(',') if v.strip()]
+    res = sync_companies(vatids, search=args.search, io_workers=args.io_workers, cpu_workers=args.cpu_workers,
+                         max_inflight=args.max_inflight, report_dir=args.report_dir)
+    stats = res.pop('_stats')
+    failed = [v for v, r in res.items() if r['error']]
+    if args.output and not failed:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump({v: r['items'] for v, r in res.items()}, fh, ensure_ascii=False, indent=2)
+    summary = {}
+    for v, r in res.items():
+        summary[v] = {k: r.get(k) for k in ('pages', 'bytes', 'io_elapsed_s', 'error', 'report', 'processed')}
+        summary[v]['items'] = len(r['items'])
+    if args.machine_json:
+        print(json.dumps({'stats': stats, 'companies': summary}, ensure_ascii=False))
+    else:
+        for v, s in summary.items():
+            print(f"{v}: {s['items']} items, {s['pages']} pages, {s['bytes']} bytes"
+                  + (f", report {s['report']}" if s.get('report') else '') + (f" (error: {s['error']})" if s['error'] else ''))
+        print(f"Total {stats['elapsed_s']}s with {stats['cpu_workers']} CPU workers "
+              f"(I/O waited {stats['cpu_blocked_s']}s on the CPU stage)")
+        if failed and args.output:
+            print(f"{len(failed)} companies failed: {args.output} was not written")
+    if failed:
+        raise SystemExit(1)
@@ -21,6 +21,7 @@ import json
 import time
 import requests
 import auth_manager
+import metrics
 
 DEFAULTS = {
     'api-bzd': os.environ.get('API_BZD', 'https://nikepp.azurewebsites.net/api/'),
@@ -74,7 +75,7 @@ def run_postman_request(req_obj: dict, use_token: bool = True, timeout: int = 30
     send_kwargs = {'headers': headers, 'timeout': timeout}
     ctype = headers.get('Content-Type', '')
     if body is None:
-        resp = requests.request(method, url, **send_kwargs)
+        resp = metrics.instrumented_request(method, url, **send_kwargs)
     else:
         # If body is a dict and content-type is json, send as json
         if isinstance(body, (dict, list)) or 'application/json' in ctype:
@@ -85,7 +86,7 @@ def run_postman_request(req_obj: dict, use_token: bool = True, timeout: int = 30
                 send_kwargs['data'] = json.dumps(body)
             else:
                 send_kwargs['data'] = body
-        resp = requests.request(method, url, **send_kwargs)
+        resp = metrics.instrumented_request(method, url, **send_kwargs)
 
     return resp
 
@@ -6,43 +6,95 @@ o processador adequado. Cada processador devolve um dicionário com chaves:
  - summary: texto resumido para inclusão em relatórios
  - artifact: opcional, caminho para ficheiro guardado (ex.: PDF ou binário)
  - notes: opcional, string com observações
+
+Os processadores ficam num registo (`PROCESSORS`) e são escolhidos por
+consulta em dicionário, sem cadeias de `if`:
+ - pelo `Content-Type` (tipo exacto, sufixo `+xml`/`+json`/`+csv` ou `text/*`);
+ - pelos primeiros bytes do corpo (`%PDF`, prólogo XML, ZIP/XLSX, BOM) quando o
+   `Content-Type` falta ou é genérico (ex.: application/octet-stream).
+
+Para acrescentar um tipo novo basta decorar a função com `register_processor`:
+
+    @register_processor('png', content_types=('image/png',), magic=(b'\\x89PNG',))
+    def _process_png(response, content_bytes):
+        ...
 """
 
 import os
 import json
 import time
-import xml.etree.ElementTree as ET
-import io
+import itertools
+
+PROCESSORS = {}      # tipo -> função(response, content_bytes)
+CONTENT_TYPES = {}   # 'application/pdf', '+xml', 'text/*' -> tipo
+MAGIC = {}           # prefixo de bytes -> tipo
+_MAGIC_LENGTHS = []  # comprimentos dos prefixos registados (maior primeiro)
+
+# Content-Types que não dizem nada sobre o conteúdo: decide-se pelos bytes
+GENERIC_CONTENT_TYPES = {'', 'application/octet-stream', 'binary/octet-stream', 'application/x-download',
+                         'application/download', 'text/plain'}
+BOMS = (b'\xef\xbb\xbf', b'\xff\xfe', b'\xfe\xff')
+# corpos desconhecidos acima deste tamanho vão directamente para disco
+LARGE_BINARY_BYTES = 1024 * 1024
+SNIFF_BYTES = 1024
+_artifact_seq = itertools.count()
+
+
+def register_processor(type_name, content_types=(), magic=()):
+    """Regista um processador para `type_name`, associado a Content-Types e prefixos de bytes."""
+    def decorator(fn):
+        PROCESSORS[type_name] = fn
+        for ct in content_types:
+            CONTENT_TYPES[ct.lower()] = type_name
+        for prefix in magic:
+            MAGIC[prefix] = type_name
+            if len(prefix) not in _MAGIC_LENGTHS:
+                _MAGIC_LENGTHS.append(len(prefix))
+                _MAGIC_LENGTHS.sort(reverse=True)
+        return fn
+    return decorator
 
 
 def _save_binary(content_bytes, ext):
     os.makedirs('artifacts', exist_ok=True)
-    filename = f"artifacts/artifact_{int(time.time()*1000)}.{ext}"
+    # pid + sequência: vários artefactos no mesmo milissegundo (ou em processos do pipeline) não colidem
+    filename = f"artifacts/artifact_{int(time.time()*1000)}_{os.getpid()}_{next(_artifact_seq)}.{ext}"
     with open(filename, 'wb') as f:
         f.write(content_bytes)
     return filename
 
 
+def _strip_bom(content_bytes):
+    for bom in BOMS:
+        if content_bytes.startswith(bom):
+            return content_bytes[len(bom):], bom
+    return content_bytes, None
+
+
+def _json_summary(data):
+    if isinstance(data, dict):
+        return f"JSON object with keys: {', '.join(list(data.keys())[:10])}"
+    if isinstance(data, list):
+        return f"JSON array of length {len(data)}"
+    return f"JSON value of type {type(data).__name__}"
+
+
+@register_processor('json', content_types=('application/json', 'application/ld+json', '+json'))
 def _process_json(response, content_bytes):
     try:
         if hasattr(response, 'json'):
             data = response.json()
         else:
-            data = json.loads(content_bytes.decode('utf-8'))
-        summary = ''
-        if isinstance(data, dict):
-            summary = f"JSON object with keys: {', '.join(list(data.keys())[:10])}"
-        elif isinstance(data, list):
-            summary = f"JSON array of length {len(data)}"
-        else:
-            summary = f"JSON value of type {type(data).__name__}"
-        return {'type': 'json', 'summary': summary, 'artifact': None}
+            data = json.loads(content_bytes.decode('utf-8-sig'))
+        return {'type': 'json', 'summary': _json_summary(data), 'artifact': None}
     except Exception as e:
         return {'type': 'json', 'summary': f'Failed to parse JSON: {e}', 'artifact': None, 'notes': str(e)}
 
 
+@register_processor('xml', content_types=('application/xml', 'text/xml', '+xml'), magic=(b'<?xml',))
 def _process_xml(response, content_bytes):
     try:
+        import xml.etree.ElementTree as ET
         root = ET.fromstring(content_bytes)
         tags = [child.tag for child in list(root)[:10]]
         summary = f"XML root: {root.tag}; child tags: {', '.join(tags)}"
@@ -51,6 +103,7 @@ def _process_xml(response, content_bytes):
         return {'type': 'xml', 'summary': f'Failed to parse XML: {e}', 'artifact': None, 'notes': str(e)}
 
 
+@register_processor('pdf', content_types=('application/pdf',), magic=(b'%PDF',))
 def _process_pdf(response, content_bytes):
     # Guarda o PDF recebido num ficheiro e devolve o caminho
     try:
@@ -60,9 +113,27 @@ def _process_pdf(response, content_bytes):
         return {'type': 'pdf', 'summary': f'Failed to save PDF: {e}', 'artifact': None, 'notes': str(e)}
 
 
+@register_processor('zip', content_types=('application/zip', 'application/x-zip-compressed',
+                                          'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+                    magic=(b'PK\x03\x04',))
+def _process_zip(response, content_bytes):
+    # Guarda o arquivo; XLSX é um ZIP com entradas em xl/
+    try:
+        import io
+        import zipfile
+        names = zipfile.ZipFile(io.BytesIO(content_bytes)).namelist()
+        kind = 'xlsx' if any(n.startswith('xl/') for n in names) else 'zip'
+        path = _save_binary(content_bytes, kind)
+        return {'type': kind, 'summary': f'{kind.upper()} with {len(names)} entries saved to {path}', 'artifact': path}
+    except Exception as e:
+        path = _save_binary(content_bytes, 'zip')
+        return {'type': 'zip', 'summary': f'ZIP saved to {path}', 'artifact': path, 'notes': str(e)}
+
+
+@register_processor('csv', content_types=('text/csv', 'application/csv', '+csv'))
 def _process_csv(response, content_bytes):
     try:
-        text = content_bytes.decode('utf-8', errors='replace')
+        text = content_bytes.decode('utf-8-sig', errors='replace')
         first_line = text.splitlines()[0] if text.splitlines() else ''
         summary = f'CSV preview header: {first_line}'
         path = _save_binary(content_bytes, 'csv')
@@ -71,6 +142,7 @@ def _process_csv(response, content_bytes):
         return {'type': 'csv', 'summary': f'Failed to process CSV: {e}', 'artifact': None, 'notes': str(e)}
 
 
+@register_processor('text', content_types=('text/*',))
 def _process_text(response, content_bytes):
     try:
         text = content_bytes.decode('utf-8', errors='replace')
@@ -80,13 +152,58 @@ def _process_text(response, content_bytes):
         return {'type': 'text', 'summary': f'Failed to decode text: {e}', 'artifact': None, 'notes': str(e)}
 
 
+@register_processor('binary')
+def _process_binary(response, content_bytes):
+    path = _save_binary(content_bytes, 'bin')
+    return {'type': 'binary', 'summary': f'Binary data saved to {path} ({len(content_bytes)} bytes)', 'artifact': path}
+
+
+@register_processor('unknown')
 def _process_unknown(response, content_bytes):
-    # Tenta JSON, depois grava como binário
+    # Sem Content-Type útil nem assinatura conhecida: grandes vão para disco sem
+    # tentativas de decode; os restantes só são lidos como JSON/texto se parecerem texto
+    if len(content_bytes) > LARGE_BINARY_BYTES:
+        return _process_binary(response, content_bytes)
+    head = content_bytes[:SNIFF_BYTES]
+    if b'\x00' in head:
+        return _process_binary(response, content_bytes)
     try:
-        return _process_json(response, content_bytes)
-    except Exception:
-        path = _save_binary(content_bytes, 'bin')
-        return {'type': 'binary', 'summary': f'Binary data saved to {path}', 'artifact': path}
+        text = content_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        return _process_binary(response, content_bytes)
+    if text.lstrip()[:1] in ('{', '['):
+        try:
+            data = json.loads(text)
+            return {'type': 'json', 'summary': _json_summary(data), 'artifact': None}
+        except ValueError:
+            pass
+    return _process_text(response, content_bytes)
+
+
+def _type_for_content_type(content_type):
+    """Tipo registado para o Content-Type (exacto, sufixo +xyz ou major/*), ou None."""
+    mime = content_type.split(';', 1)[0].strip()
+    hit = CONTENT_TYPES.get(mime)
+    if hit is None and '+' in mime:
+        hit = CONTENT_TYPES.get('+' + mime.rsplit('+', 1)[1])
+    if hit is None and '/' in mime:
+        hit = CONTENT_TYPES.get(mime.split('/', 1)[0] + '/*')
+    return hit
+
+
+def sniff_type(content_bytes):
+    """Tipo registado pelos primeiros bytes (%PDF, <?xml, PK.., BOM), ou None."""
+    body, bom = _strip_bom(content_bytes[:SNIFF_BYTES])
+    for n in _MAGIC_LENGTHS:
+        hit = MAGIC.get(body[:n])
+        if hit is not None:
+            return hit
+    if bom is not None:
+        # texto com BOM: JSON se começar por { ou [, senão CSV (exportações do Excel)
+        if bom == BOMS[0] and body.lstrip()[:1] in (b'{', b'['):
+            return 'json'
+        return 'csv'
+    return None
 
 
 def process_response(response):
@@ -111,17 +228,8 @@ def process_response(response):
     if content_bytes is None:
         content_bytes = b''
 
-    # Roteamento básico por content-type
-    if 'application/json' in content_type or content_type.startswith('application/ld+json'):
-        return _process_json(response, content_bytes)
-    if 'application/xml' in content_type or content_type.endswith('+xml') or content_type == 'text/xml':
-        return _process_xml(response, content_bytes)
-    if 'application/pdf' in content_type:
-        return _process_pdf(response, content_bytes)
-    if 'text/csv' in content_type or content_type.endswith('+csv') or content_type == 'text/csv':
-        return _process_csv(response, content_bytes)
-    if content_type.startswith('text/'):
-        return _process_text(response, content_bytes)
-
-    # Fallback
-    return _process_unknown(response, content_bytes)
+    # O Content-Type específico manda; se faltar ou for genérico, decidem os bytes
+    kind = _type_for_content_type(content_type)
+    if kind is None or content_type.split(';', 1)[0].strip() in GENERIC_CONTENT_TYPES:
+        kind = sniff_type(content_bytes) or kind or 'unknown'
+    return PROCESSORS[kind](response, content_bytes)
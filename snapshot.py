@@ -0,0 +1,230 @@
+"""Full company snapshot: InAccounting, Accounted, FTE and FTEExported in one pass.
+
+The four Documents searches run concurrently, one thread each, and every thread
+follows its own `paginationKey` until the last page. Items are normalised with
+`main.canonicalize_item` (the same shape written to in_accounting.json) and
+deduplicated by documentId across endpoints. Each merged document carries:
+
+- sources: the searches that returned it
+- statusLineage: one {source, documentStatus, updatedOn} entry per search,
+  oldest first; the document's documentStatus is the last one in the lineage
+
+A full snapshot therefore takes roughly as long as the slowest endpoint. The
+merged dataset is written atomically to SNAPSHOT_JSON_PATH so readers (e.g.
+Visual FoxPro) never see a half-written file. Pages answered with 429/5xx are
+retried (honouring Retry-After); if a search still fails the snapshot is
+incomplete and is written to `<path>.partial` instead, leaving the last good
+snapshot in place (a missing search would otherwise look like deleted
+documents downstream). The CLI then exits with status 1.
+
+Usage:
+  python snapshot.py --vatid PT504419811
+  python snapshot.py --searches InAccounting,Accounted --output C:\\temp\\snapshot.json --machine-json
+"""
+
+import os
+import json
+import time
+
+import main
+import auth_manager
+
+SEARCHES = ('InAccounting', 'Accounted', 'FTE', 'FTEExported')
+SNAPSHOT_JSON_PATH = r'C:\temp\bizdocs_snapshot.json'
+
+# Request bodies per search; InAccounting keeps the default status filter of main.call_in_accounting
+DEFAULT_PAYLOADS = {
+    'InAccounting': {'documentStatus': ['accountvalidation', 'manualentry']},
+    'Accounted': {},
+    'FTE': {},
+    'FTEExported': {},
+}
+
+# Status recorded in the lineage when an endpoint returns items without documentStatus
+_SOURCE_STATUS = {
+    'InAccounting': 'inaccounting',
+    'Accounted': 'accounted',
+    'FTE': 'fte',
+    'FTEExported': 'fteexported',
+}
+
+MAX_PAGES = 10000  # guard against a server that keeps returning the same paginationKey
+MAX_RETRIES = 5    # resends per page on 429/5xx
+
+
+def fetch_all_pages(search: str, vatid: str, payload: dict = None, timeout: int = 30,
+                    max_retries: int = MAX_RETRIES):
+    """Follow the pagination of one Documents search. Returns (items, info dict)."""
+    payload = dict(payload if payload is not None else DEFAULT_PAYLOADS.get(search, {}))
+    payload.pop('paginationKey', None)
+    items, pages, status, error = [], 0, None, None
+    seen_keys = set()
+    start = time.perf_counter()
+    try:
+        while pages < MAX_PAGES:
+            resp, page_items, key = main.search_documents(search, vatid=vatid, payload=payload, timeout=timeout,
+                                                          max_retries=max_retries)
+            pages += 1
+            status = resp.status_code
+            if status >= 400:
+                error = f'HTTP {status}'
+                break
+            items.extend(page_items)
+            if not key or key in seen_keys:
+                break
+            seen_keys.add(key)
+            payload['paginationKey'] = key
+    except Exception as e:
+        error = str(e)
+    info = {
+        'items': len(items),
+        'pages': pages,
+        'status': status,
+        'elapsed_s': round(time.perf_counter() - start, 4),
+        'error': error,
+    }
+    return items, info
+
+
+def merge_results(results: dict):
+    """Merge {search: [raw items]} into canonical items deduplicated by documentId.
+
+    Items without a documentId are kept as they are (they cannot be matched).
+    """
+    merged = {}
+    unmatched = []
+    for search in [s for s in SEARCHES if s in results] + [s for s in results if s not in SEARCHES]:
+        for raw in results[search]:
+            item = main.canonicalize_item(raw)
+            doc_id = item.get('documentId')
+            entry = {
+                'source': search,
+                'documentStatus': item.get('documentStatus') or _SOURCE_STATUS.get(search, search.lower()),
+                'updatedOn': item.get('updatedOn') or raw.get('accountedTimeStamp') or item.get('createdOn') or '',
+            }
+            if not doc_id:
+                item.update({'sources': [search], 'statusLineage': [entry]})
+                unmatched.append(item)
+                continue
+            current = merged.get(doc_id)
+            if current is None:
+                item.update({'sources': [search], 'statusLineage': [entry]})
+                merged[doc_id] = item
+                continue
+            # fill fields the earlier endpoints did not return
+            for k, v in item.items():
+                if v not in ('', 0, None) and current.get(k) in ('', 0, None):
+                    current[k] = v
+            if search not in current['sources']:
+                current['sources'].append(search)
+            current['statusLineage'].append(entry)
+
+    out = []
+    for item in merged.values():
+        # stable sort: equal timestamps keep the SEARCHES order
+        item['statusLineage'].sort(key=lambda e: e['updatedOn'])
+        last = item['statusLineage'][-1]
+        item['documentStatus'] = last['documentStatus']
+        if last['updatedOn'] > (item.get('updatedOn') or ''):
+            item['updatedOn'] = last['updatedOn']
+        out.append(item)
+    return out + unmatched
+
+
+def _publish(obj: dict, path: str):
+    """Write `obj` as JSON to `path` atomically (temp file + rename)."""
+    save_dir = os.path.dirname(path)
+    if save_dir and not os.path.exists(save_dir):
+        os.makedirs(save_dir, exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(obj, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def take_snapshot(vatid=None, searches=SEARCHES, payloads: dict = None, output_path: str = None, timeout: int = 30):
+    """Run the searches concurrently, merge them and publish the dataset.
+
+    - vatid: company VAT id (defaults to main.VATID)
+    - searches: subset of SEARCHES to run
+    - payloads: optional {search: body} overriding DEFAULT_PAYLOADS
+    - output_path: where to publish (defaults to SNAPSHOT_JSON_PATH; '' = don't write)
+
+    Returns a dict with keys vatid, generatedAt, complete, items, sources (per-search
+    info) and output (the path written, or None). When any search has an error,
+    complete is False and the dataset goes to `<output_path>.partial`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    vatid = vatid or main.VATID
+    payloads = payloads or {}
+    # fetch the token once up front so the workers don't all refresh it at the same time
+    if not auth_manager.get_access_token():
+        raise RuntimeError('Não foi possível obter token de acesso')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(searches))) as pool:
+        futures = {s: pool.submit(fetch_all_pages, s, vatid, payloads.get(s), timeout) for s in searches}
+        fetched = {s: f.result() for s, f in futures.items()}
+
+    items = merge_results({s: fetched[s][0] for s in searches})
+    complete = not any(fetched[s][1]['error'] for s in searches)
+    snapshot = {
+        'vatid': vatid,
+        'generatedAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'elapsed_s': round(time.perf_counter() - start, 4),
+        'complete': complete,
+        'sources': {s: fetched[s][1] for s in searches},
+        'items': items,
+    }
+    path = SNAPSHOT_JSON_PATH if output_path is None else output_path
+    if path and not complete:
+        path = f'{path}.partial'
+    snapshot['output'] = None
+    if path:
+        try:
+            snapshot['output'] = _publish(snapshot, path)
+        except Exception:
+            if main.DEBUG:
+                print(f'Warning: failed to write snapshot to {path}')
+    return snapshot
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Snapshot InAccounting, Accounted, FTE and FTEExported in one pass')
+    parser.add_argument('--url', default=main.BASE_URL, help='Base URL or template (default from main.BASE_URL)')
+    parser.add_argument('--vatid', default=main.VATID, help='Company VAT id')
+    parser.add_argument('--searches', default=','.join(SEARCHES), help='Comma-separated subset of searches')
+    parser.add_argument('--output', default=SNAPSHOT_JSON_PATH, help='Merged dataset path')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON summary (for VFP)')
+    args = parser.parse_args()
+
+    searches = tuple(s.strip() for s in args.searches.split(',') if s.strip())
+    unknown = set(searches) - set(SEARCHES)
+    if unknown:
+        parser.error(f"unknown searches: {', '.join(sorted(unknown))}")
+    main.BASE_URL = args.url
+
+    snap = take_snapshot(vatid=args.vatid, searches=searches, output_path=args.output)
+    summary = {
+        'vatid': snap['vatid'],
+        'complete': snap['complete'],
+        'items': len(snap['items']),
+        'elapsed_s': snap['elapsed_s'],
+        'sources': snap['sources'],
+        'output': snap['output'],
+    }
+    if args.machine_json:
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        for search, info in snap['sources'].items():
+            print(f"{search}: {info['items']} items in {info['pages']} pages, {info['elapsed_s']}s"
+                  + (f" (error: {info['error']})" if info['error'] else ''))
+        print(f"Merged {len(snap['items'])} documents in {snap['elapsed_s']}s -> {snap['output']}")
+        if not snap['complete']:
+            print(f'Snapshot incomplete: {args.output} was not replaced')
+    if not snap['complete']:
+        raise SystemExit(1)
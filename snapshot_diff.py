@@ -0,0 +1,367 @@
+"""Change detection between consecutive InAccounting snapshots.
+
+The downstream ERP only needs what changed since the previous
+in_accounting.json. This module keeps a state file with one line per document
+({documentId, hash, doc}) and, for every new snapshot, emits a change feed:
+
+  {"op": "insert", "documentId": ..., "document": {...}}
+  {"op": "update", "documentId": ..., "changes": {"field": [old, new], ...}}
+  {"op": "delete", "documentId": ..., "documentNumber": ...}
+
+The hash is a SHA-1 of the canonical item (sorted keys), so an update is only
+reported when some field really changed.
+
+Cost is linear and memory stays small: the previous state is read once into
+{documentId: (hash, file offset)}, the new snapshot is streamed item by item
+(the top-level JSON `items` array is decoded incrementally, JSON Lines line by
+line), and old values are read back by offset only for the documents that
+changed. The feed is written as JSON Lines or as a dBase III table (.dbf) that
+VFP can USE.
+
+Usage:
+  python snapshot_diff.py --new C:\\temp\\in_accounting.json --output C:\\temp\\in_accounting_changes.jsonl
+  python snapshot_diff.py --new C:\\temp\\in_accounting.json --output C:\\temp\\in_accounting_changes.dbf
+  python snapshot_diff.py --old yesterday.json --new today.json --output changes.jsonl --no-state
+"""
+
+import os
+import json
+import time
+import struct
+import hashlib
+import datetime
+
+import main
+
+STATE_PATH = r'C:\temp\in_accounting.state.jsonl'
+CHUNK_SIZE = 1 << 16
+
+
+class _JsonStream:
+    """Incremental reader over a JSON text: decodes one value at a time, refilling as needed."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        more = self.fh.read(CHUNK_SIZE)
+        if not more:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + more
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or '' at end of file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'expected {char!r} at offset {self.pos} of the current buffer')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # a number (or literal) ending at the buffer edge may continue in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def array(self):
+        """Yield the elements of the array whose '[' was just consumed."""
+        while True:
+            c = self.peek()
+            if c == ']':
+                self.pos += 1
+                return
+            if c == ',':
+                self.pos += 1
+                continue
+            if not c:
+                raise ValueError('unexpected end of file inside an array')
+            yield self.value()
+
+
+def iter_documents(path: str):
+    """Yield the documents of a JSON snapshot ({'items': [...]} or a list) or JSON Lines file, streaming.
+
+    For a JSON object only the top-level `items` array is streamed; other top-level
+    values (paginationKey, sources, ...) are decoded and skipped. Raises ValueError
+    when the file has no top-level array to read.
+    """
+    if path.lower().endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(path, 'r', encoding='utf-8') as fh:
+        stream = _JsonStream(fh)
+        c = stream.peek()
+        if c == '[':
+            stream.pos += 1
+            for obj in stream.array():
+                if isinstance(obj, dict):
+                    yield obj
+            return
+        stream.expect('{')
+        while True:
+            c = stream.peek()
+            if c == '}' or not c:
+                break
+            if c == ',':
+                stream.pos += 1
+                continue
+            key = stream.value()
+            stream.expect(':')
+            if key != 'items':
+                stream.value()
+                continue
+            if stream.peek() != '[':
+                raise ValueError(f'{path}: top-level "items" is not an array')
+            stream.pos += 1
+            for obj in stream.array():
+                if isinstance(obj, dict):
+                    yield obj
+            return
+    raise ValueError(f'{path}: no top-level "items" array')
+
+
+def document_hash(doc: dict):
+    return hashlib.sha1(json.dumps(doc, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _load_state(path: str):
+    """Return {documentId: (hash, offset)} for a state file (empty if it doesn't exist)."""
+    state = {}
+    if not path or not os.path.exists(path):
+        return state
+    with open(path, 'rb') as fh:
+        offset = 0
+        for raw in fh:
+            if raw.strip():
+                rec = json.loads(raw)
+                state[rec['documentId']] = (rec['hash'], offset)
+            offset += len(raw)
+    return state
+
+
+def _read_state_doc(fh, offset: int):
+    fh.seek(offset)
+    return json.loads(fh.readline())['doc']
+
+
+def build_state(snapshot_path: str, state_path: str):
+    """Write a state file for an existing snapshot (used when diffing two arbitrary files)."""
+    with open(state_path, 'w', encoding='utf-8') as out:
+        for raw in iter_documents(snapshot_path):
+            doc = main.canonicalize_item(raw)
+            if doc['documentId']:
+                out.write(json.dumps({'documentId': doc['documentId'], 'hash': document_hash(doc), 'doc': doc},
+                                     ensure_ascii=False) + '\n')
+    return state_path
+
+
+def diff_snapshot(new_path: str, state_path: str = STATE_PATH, update_state: bool = True):
+    """Yield change records for `new_path` against the state in `state_path`.
+
+    With update_state the state file is replaced (atomically) by the new snapshot
+    once the feed has been fully consumed. Items without documentId are ignored.
+    """
+    previous = _load_state(state_path)
+    seen = set()
+    tmp_state = f'{state_path}.tmp' if update_state else None
+    state_out = open(tmp_state, 'w', encoding='utf-8') if tmp_state else None
+    old_fh = open(state_path, 'rb') if previous else None
+    try:
+        for raw in iter_documents(new_path):
+            doc = main.canonicalize_item(raw)
+            doc_id = doc['documentId']
+            if not doc_id or doc_id in seen:
+                continue
+            seen.add(doc_id)
+            h = document_hash(doc)
+            if state_out:
+                state_out.write(json.dumps({'documentId': doc_id, 'hash': h, 'doc': doc}, ensure_ascii=False) + '\n')
+            prev = previous.get(doc_id)
+            if prev is None:
+                yield {'op': 'insert', 'documentId': doc_id, 'document': doc}
+            elif prev[0] != h:
+                old = _read_state_doc(old_fh, prev[1])
+                changes = {k: [old.get(k), v] for k, v in doc.items() if old.get(k) != v}
+                changes.update({k: [v, None] for k, v in old.items() if k not in doc})
+                yield {'op': 'update', 'documentId': doc_id, 'changes': changes, 'document': doc}
+        for doc_id, (_, offset) in previous.items():
+            if doc_id not in seen:
+                old = _read_state_doc(old_fh, offset)
+                yield {'op': 'delete', 'documentId': doc_id, 'documentNumber': old.get('documentNumber', ''),
+                       'document': old}
+    except BaseException:
+        if state_out:
+            state_out.close()
+            os.remove(tmp_state)
+            state_out = None
+        raise
+    finally:
+        if old_fh:
+            old_fh.close()
+        if state_out:
+            state_out.close()
+            os.replace(tmp_state, state_path)
+
+
+def _feed_record(change: dict):
+    """Compact JSON Lines form: full document for inserts, changed fields only for updates."""
+    out = {'op': change['op'], 'documentId': change['documentId']}
+    if change['op'] == 'insert':
+        out['document'] = change['document']
+    elif change['op'] == 'update':
+        out['changes'] = change['changes']
+    else:
+        out['documentNumber'] = change.get('documentNumber', '')
+    return out
+
+
+def write_jsonl(changes, path: str):
+    """Write the change feed as JSON Lines. Returns {op: count}."""
+    counts = {'insert': 0, 'update': 0, 'delete': 0}
+    with open(path, 'w', encoding='utf-8') as fh:
+        for change in changes:
+            counts[change['op']] += 1
+            fh.write(json.dumps(_feed_record(change), ensure_ascii=False) + '\n')
+    return counts
+
+
+# dBase III layout for the change feed: (name, type, length, decimals, source field)
+DBF_FIELDS = [
+    ('OP', 'C', 6, 0, None),
+    ('CHANGED', 'C', 254, 0, None),
+    ('DOCID', 'C', 50, 0, 'documentId'),
+    ('DOCNUMBER', 'C', 50, 0, 'documentNumber'),
+    ('DOCNAME', 'C', 100, 0, 'documentName'),
+    ('DOCDATE', 'C', 10, 0, 'documentDate'),
+    ('JOURNAL', 'C', 50, 0, 'journalGroupName'),
+    ('ACCYEAR', 'N', 4, 0, 'accountancyYear'),
+    ('ACCMONTH', 'N', 2, 0, 'accountancyMonth'),
+    ('COSTCENTER', 'C', 50, 0, 'costCenter'),
+    ('VENDORVAT', 'C', 20, 0, 'documentVendorVatId'),
+    ('CUSTVAT', 'C', 20, 0, 'documentCustomerVatId'),
+    ('TOTAL', 'N', 14, 2, 'documentTotalAmount'),
+    ('STATUS', 'C', 20, 0, 'documentStatus'),
+    ('UPDATEDON', 'C', 30, 0, 'updatedOn'),
+    ('CREATEDON', 'C', 30, 0, 'createdOn'),
+]
+
+
+def _dbf_value(ftype, length, decimals, value):
+    if ftype == 'N':
+        try:
+            text = f'{float(value or 0):.{decimals}f}' if decimals else str(int(float(value or 0)))
+        except (TypeError, ValueError):
+            text = '0'
+        return text.rjust(length)[:length].encode('ascii')
+    text = '' if value is None else str(value)
+    return text.encode('cp1252', errors='replace')[:length].ljust(length, b' ')
+
+
+def write_dbf(changes, path: str):
+    """Write the change feed as a dBase III table (one row per change, cp1252). Returns {op: count}."""
+    counts = {'insert': 0, 'update': 0, 'delete': 0}
+    record_len = 1 + sum(f[2] for f in DBF_FIELDS)
+    header_len = 32 + 32 * len(DBF_FIELDS) + 1
+    today = datetime.date.today()
+    with open(path, 'wb') as fh:
+        # record count is patched once the feed has been streamed
+        fh.write(struct.pack('<BBBBIHH20x', 0x03, today.year - 1900, today.month, today.day, 0, header_len, record_len))
+        fh.seek(29)
+        fh.write(b'\x03')  # language driver: Windows ANSI (cp1252)
+        fh.seek(32)
+        for name, ftype, length, decimals, _ in DBF_FIELDS:
+            fh.write(struct.pack('<11sc4xBB14x', name.encode('ascii'), ftype.encode('ascii'), length, decimals))
+        fh.write(b'\x0D')
+        n = 0
+        for change in changes:
+            counts[change['op']] += 1
+            doc = change.get('document') or {}
+            row = [b' ']
+            for name, ftype, length, decimals, source in DBF_FIELDS:
+                if name == 'OP':
+                    value = change['op']
+                elif name == 'CHANGED':
+                    value = ','.join(change.get('changes', {}))
+                elif name == 'DOCID':
+                    value = change['documentId']
+                else:
+                    value = doc.get(source)
+                row.append(_dbf_value(ftype, length, decimals, value))
+            fh.write(b''.join(row))
+            n += 1
+        fh.write(b'\x1A')
+        fh.seek(4)
+        fh.write(struct.pack('<I', n))
+    return counts
+
+
+def write_feed(changes, path: str):
+    """Write the change feed to `path`: .dbf -> dBase III, anything else -> JSON Lines."""
+    if path.lower().endswith('.dbf'):
+        return write_dbf(changes, path)
+    return write_jsonl(changes, path)
+
+
+def diff_files(old_path: str, new_path: str, output_path: str):
+    """Diff two arbitrary snapshot files without touching the persistent state. Returns {op: count}."""
+    tmp_state = f'{output_path}.{int(time.time() * 1000)}.state.jsonl'
+    try:
+        build_state(old_path, tmp_state)
+        return write_feed(diff_snapshot(new_path, tmp_state, update_state=False), output_path)
+    finally:
+        if os.path.exists(tmp_state):
+            os.remove(tmp_state)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Emit only the changes between consecutive InAccounting snapshots')
+    parser.add_argument('--new', default=main.IN_ACCOUNTING_JSON_PATH, help='New snapshot (JSON or JSON Lines)')
+    parser.add_argument('--old', help='Previous snapshot; if omitted the persistent state file is used')
+    parser.add_argument('--state', default=STATE_PATH, help='State file carried between runs')
+    parser.add_argument('--no-state', action='store_true', help='Do not update the state file')
+    parser.add_argument('--output', default=r'C:\temp\in_accounting_changes.jsonl', help='.jsonl or .dbf')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON summary (for VFP)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.old:
+        counts = diff_files(args.old, args.new, args.output)
+    else:
+        counts = write_feed(diff_snapshot(args.new, args.state, update_state=not args.no_state), args.output)
+    summary = dict(counts, output=args.output, elapsed_s=round(time.perf_counter() - start, 4))
+    if args.machine_json:
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        print(f"{counts['insert']} inserts, {counts['update']} updates, {counts['delete']} deletes -> {args.output}")
@@ -0,0 +1,102 @@
+"""Measure import time of the CLI entry points and of their heavy dependencies.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so the
+numbers are cold-start costs exactly as seen by a new process spawned from
+Visual FoxPro. The report lists, for every module, its own import time and the
+cumulative time including everything it imports.
+
+Usage:
+  python main.py --profile-startup
+  python startup_profile.py main extracted_metadata reportlab.pdfgen.canvas
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+# Entry points plus the modules that should only be loaded on the paths that need them
+DEFAULT_MODULES = [
+    'main',
+    'extracted_metadata',
+    'auth_manager',
+    'response_processors',
+    'pdf_utils',
+    'requests',
+    'reportlab.pdfgen.canvas',
+    'xml.etree.ElementTree',
+    'csv',
+]
+
+
+def _parse_importtime(stderr_text: str):
+    """Parse `-X importtime` output into {module: (self_us, cumulative_us)}."""
+    timings = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            # header line ("self [us] | cumulative | imported package")
+            continue
+        timings[parts[2].strip()] = (self_us, cumulative_us)
+    return timings
+
+
+def profile_module(module_name: str, cwd: str = None):
+    """Import `module_name` in a fresh interpreter and return its timing dict.
+
+    Returned keys: module, self_ms, cumulative_ms, imported (number of modules
+    loaded as a consequence of the import) and error (None on success).
+    """
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    timings = _parse_importtime(proc.stderr)
+    self_us, cumulative_us = timings.get(module_name, (0, 0))
+    error = None
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ['import failed'])[-1]
+    return {
+        'module': module_name,
+        'self_ms': round(self_us / 1000.0, 2),
+        'cumulative_ms': round(cumulative_us / 1000.0, 2),
+        'imported': len(timings),
+        'error': error
+    }
+
+
+def profile_startup(modules=None, cwd: str = None):
+    """Profile each module in `modules` (defaults to DEFAULT_MODULES) and return a list of dicts."""
+    return [profile_module(m, cwd=cwd) for m in (modules or DEFAULT_MODULES)]
+
+
+def print_startup_profile(results, machine_json: bool = False):
+    """Print the results of `profile_startup` as a table or as single-line JSON (for VFP)."""
+    if machine_json:
+        print(json.dumps({'startup_profile': results}, ensure_ascii=False))
+        return
+    width = max([len(r['module']) for r in results] + [6])
+    print(f"{'module'.ljust(width)}  {'self ms':>9}  {'cumul ms':>9}  {'modules':>7}")
+    for r in results:
+        line = f"{r['module'].ljust(width)}  {r['self_ms']:>9.2f}  {r['cumulative_ms']:>9.2f}  {r['imported']:>7}"
+        if r['error']:
+            line += f"  ERROR: {r['error']}"
+        print(line)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Report cold import time per module')
+    parser.add_argument('modules', nargs='*', help='Modules to profile (default: entry points and heavy deps)')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON (for VFP)')
+    args = parser.parse_args()
+    print_startup_profile(profile_startup(args.modules or None), machine_json=args.machine_json)
@@ -0,0 +1,332 @@
+"""Record API traffic to JSON Lines and replay it for offline regression and load tests.
+
+Recording hooks into `metrics` (every outbound request goes through
+`metrics.instrumented_request`) and appends one JSON object per request/response
+pair, with timing, to a log file. Secrets are masked before writing: the
+Authorization header, cookies, and any JSON/form field whose name looks like a
+password, secret or token.
+
+Replaying reads that log and re-sends each API request to the original server or
+a local stand-in (`mock_server`), either at the original pacing, N times faster
+or as fast as possible, with a configurable number of concurrent workers. Token
+requests are not replayed: the replayer obtains its own token via `auth_manager`.
+
+Usage:
+  python main.py --run-inaccounting --record recordings/requests.jsonl
+  python traffic.py recordings/requests.jsonl --mock --speed 0 --concurrency 8
+  python traffic.py recordings/requests.jsonl --target http://127.0.0.1:8085/api/ --speed 2
+"""
+
+import re
+import json
+import time
+import base64
+import hashlib
+import threading
+
+import metrics
+
+DEFAULT_LOG_PATH = 'recordings/requests.jsonl'
+MAX_BODY_BYTES = 256 * 1024   # larger response bodies are stored as sha256 + size only
+MASK = '***'
+
+_SECRET_RE = re.compile(r'(pass(word)?|secret|(^|_)token$|authorization|cookie|api[-_]?key)', re.IGNORECASE)
+_TOKEN_ENDPOINT = 'identity/connect/token'
+
+
+def _mask_value(key, value):
+    return MASK if _SECRET_RE.search(str(key)) and value not in (None, '') else value
+
+
+def mask_secrets(obj):
+    """Return a copy of a JSON-like object with secret-looking keys masked."""
+    if isinstance(obj, dict):
+        return {k: (MASK if _SECRET_RE.search(str(k)) and isinstance(v, (str, int, float)) else mask_secrets(v))
+                for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [mask_secrets(v) for v in obj]
+    return obj
+
+
+def _encode_body(body, content_type: str = ''):
+    """Return a JSON-serialisable representation of a request/response body, with secrets masked."""
+    if body is None or body == b'' or body == '':
+        return None
+    if isinstance(body, (bytes, bytearray)):
+        try:
+            text = bytes(body).decode('utf-8')
+        except UnicodeDecodeError:
+            return {'base64': base64.b64encode(bytes(body)).decode('ascii')}
+    else:
+        text = str(body)
+    try:
+        return {'json': mask_secrets(json.loads(text))}
+    except ValueError:
+        pass
+    if 'x-www-form-urlencoded' in (content_type or '') or re.fullmatch(r'[^=&\s]+=[^&]*(&[^=&\s]+=[^&]*)*', text):
+        from urllib.parse import parse_qsl, urlencode
+        pairs = [(k, _mask_value(k, v)) for k, v in parse_qsl(text, keep_blank_values=True)]
+        return {'form': urlencode(pairs)}
+    return {'text': text}
+
+
+def decode_body(encoded):
+    """Inverse of `_encode_body` for replay: returns (kwargs for requests.request)."""
+    if not encoded:
+        return {}
+    if 'json' in encoded:
+        return {'json': encoded['json']}
+    if 'form' in encoded:
+        return {'data': encoded['form']}
+    if 'base64' in encoded:
+        return {'data': base64.b64decode(encoded['base64'])}
+    return {'data': encoded.get('text', '')}
+
+
+def _mask_headers(headers):
+    return {k: _mask_value(k, v) for k, v in dict(headers or {}).items()}
+
+
+class TrafficRecorder:
+    """Append request/response pairs observed by `metrics` to a JSON Lines file."""
+
+    def __init__(self, path: str = DEFAULT_LOG_PATH, max_body_bytes: int = MAX_BODY_BYTES):
+        self.path = path
+        self.max_body_bytes = max_body_bytes
+        self.count = 0
+        self._lock = threading.Lock()
+        self._fh = None
+
+    def start(self):
+        import os
+        out_dir = os.path.dirname(self.path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        self._fh = open(self.path, 'a', encoding='utf-8')
+        metrics.add_listener(self)
+        return self
+
+    def stop(self):
+        metrics.remove_listener(self)
+        with self._lock:
+            if self._fh:
+                self._fh.close()
+                self._fh = None
+
+    def __call__(self, rec, resp):
+        entry = {
+            'ts': rec['ts'] - rec['total_s'],   # request start (epoch seconds)
+            'method': rec['method'],
+            'url': rec['url'],
+            'endpoint': rec['endpoint'],
+            'vatid': rec['vatid'],
+            'timing': {k: round(rec.get(k) or 0.0, 6) for k in metrics.TIMING_FIELDS},
+            'retries': rec.get('retries', 0),
+        }
+        if resp is None:
+            entry['request'] = {'headers': {}, 'body': None}
+            entry['response'] = {'status': rec['status'], 'error': rec.get('error')}
+        else:
+            req = resp.request
+            req_ctype = req.headers.get('Content-Type', '')
+            entry['request'] = {'headers': _mask_headers(req.headers), 'body': _encode_body(req.body, req_ctype)}
+            content = resp.content or b''
+            response = {
+                'status': resp.status_code,
+                'headers': _mask_headers(resp.headers),
+                'bytes': len(content),
+                'sha256': hashlib.sha256(content).hexdigest(),
+            }
+            if len(content) <= self.max_body_bytes:
+                response['body'] = _encode_body(content, resp.headers.get('Content-Type', ''))
+            entry['response'] = response
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._fh:
+                self._fh.write(line)
+                self._fh.flush()
+                self.count += 1
+
+
+_active_recorder = None
+
+
+def start_recording(path: str = DEFAULT_LOG_PATH):
+    """Start appending all instrumented requests to `path`. Returns the recorder."""
+    global _active_recorder
+    stop_recording()
+    _active_recorder = TrafficRecorder(path).start()
+    return _active_recorder
+
+
+def stop_recording():
+    global _active_recorder
+    if _active_recorder is not None:
+        _active_recorder.stop()
+        _active_recorder = None
+
+
+def load_log(path: str):
+    """Yield the entries of a recorded JSON Lines log, skipping blank or malformed lines."""
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def rewrite_url(url: str, target: str = None):
+    """Point a recorded URL at `target` (an API base such as http://127.0.0.1:8085/api/).
+
+    The scheme, host and an optional leading /api of the recorded URL are replaced;
+    the rest of the path and the query string are kept.
+    """
+    if not target:
+        return url
+    path = re.sub(r'^[a-zA-Z]+://[^/]+', '', url)
+    if path.startswith('/api/'):
+        path = path[len('/api'):]
+    return target.rstrip('/') + path
+
+
+def replay(path: str, target: str = None, speed: float = 1.0, concurrency: int = 1,
+           timeout: int = 30, results_path: str = None):
+    """Re-send the API requests recorded in `path` and return a summary dict.
+
+    - target: API base to send to (None = the recorded URLs)
+    - speed: 1.0 = original pacing, N = N times faster, 0 = as fast as possible
+    - concurrency: number of worker threads sending requests
+    - results_path: optional JSON Lines file with one result per replayed request
+
+    The summary holds sent (requests attempted), errors, status_mismatches,
+    body_mismatches, elapsed_s, requests_per_sec, p50_ms and p99_ms. A request that
+    could not be sent at all (e.g. no token) counts as an error with status 'error'.
+    """
+    import auth_manager
+    from concurrent.futures import ThreadPoolExecutor
+
+    entries = [e for e in load_log(path) if e.get('endpoint') != _TOKEN_ENDPOINT and e.get('url')]
+    entries.sort(key=lambda e: e.get('ts') or 0)
+
+    token_lock = threading.Lock()
+
+    def bearer():
+        with token_lock:
+            info = auth_manager.TOKEN_INFO
+            if info.get('access_token') and info.get('expiry_timestamp', 0) > time.time() + 60:
+                return info['access_token']
+            token = auth_manager.get_access_token()
+        if not token:
+            raise RuntimeError('Não foi possível obter token de acesso')
+        return token
+
+    results = []
+    results_lock = threading.Lock()
+    slots = threading.Semaphore(max(1, concurrency))
+
+    def send(entry):
+        # every entry yields a result: a failure anywhere (token, body decoding, URL
+        # rewriting, the request itself) is recorded as status 'error', never dropped
+        t0 = time.perf_counter()
+        status, sha, error = 'error', None, None
+        try:
+            headers = {k: v for k, v in (entry.get('request', {}).get('headers') or {}).items()
+                       if k.lower() not in ('authorization', 'content-length', 'host', 'cookie')}
+            headers['Authorization'] = f'Bearer {bearer()}'
+            kwargs = decode_body(entry.get('request', {}).get('body'))
+            resp = metrics.instrumented_request(entry['method'], rewrite_url(entry['url'], target),
+                                                headers=headers, timeout=timeout, **kwargs)
+            status, sha = resp.status_code, hashlib.sha256(resp.content or b'').hexdigest()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        try:
+            recorded = entry.get('response') or {}
+            result = {
+                'method': entry.get('method'),
+                'endpoint': entry.get('endpoint'),
+                'recorded_status': recorded.get('status'),
+                'status': status,
+                'latency_s': time.perf_counter() - t0,
+                'recorded_latency_s': (entry.get('timing') or {}).get('total_s'),
+                'body_match': sha is not None and sha == recorded.get('sha256'),
+            }
+            if error:
+                result['error'] = error
+            with results_lock:
+                results.append(result)
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    first_ts = entries[0].get('ts', 0) if entries else 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for entry in entries:
+            if speed and speed > 0:
+                due = ((entry.get('ts') or first_ts) - first_ts) / speed
+                delay = due - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            # bounded: never queue more requests than there are workers
+            slots.acquire()
+            pool.submit(send, entry)
+    elapsed = time.perf_counter() - start
+
+    if results_path:
+        with open(results_path, 'w', encoding='utf-8') as fh:
+            for r in results:
+                fh.write(json.dumps(r, ensure_ascii=False) + '\n')
+
+    latencies = [r['latency_s'] for r in results]
+    return {
+        'sent': len(results),
+        'errors': sum(1 for r in results if r['status'] == 'error' or r['status'] >= 400),
+        'status_mismatches': sum(1 for r in results if r['status'] != r['recorded_status']),
+        'body_mismatches': sum(1 for r in results if not r['body_match']),
+        'elapsed_s': round(elapsed, 4),
+        'requests_per_sec': round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': round(metrics.percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(metrics.percentile(latencies, 99) * 1000, 3),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay recorded BizDocs API traffic')
+    parser.add_argument('log', nargs='?', default=DEFAULT_LOG_PATH, help='Recorded JSON Lines log')
+    parser.add_argument('--target', help='API base URL to replay against (default: recorded URLs)')
+    parser.add_argument('--mock', action='store_true', help='Start a local mock server and replay against it')
+    parser.add_argument('--mock-latency-ms', type=float, default=0, help='Latency of the local mock server')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = original pacing, N = N x faster, 0 = max throughput')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--results', help='Write per-request replay results to this JSON Lines file')
+    parser.add_argument('--metrics-out', help='Write request metrics (.prom = Prometheus text, otherwise JSON Lines)')
+    parser.add_argument('--machine-json', action='store_true', help='Print single-line JSON (for VFP)')
+    args = parser.parse_args()
+
+    server = None
+    target = args.target
+    if args.mock:
+        import auth_manager
+        from mock_server import MockBizDocsServer
+        server = MockBizDocsServer(latency_ms=args.mock_latency_ms).start()
+        target = server.api_url
+        auth_manager.TOKEN_URL = server.token_url
+    try:
+        summary = replay(args.log, target=target, speed=args.speed, concurrency=args.concurrency,
+                         results_path=args.results)
+    finally:
+        if server:
+            server.stop()
+    if args.metrics_out:
+        metrics.export(args.metrics_out)
+
+    if args.machine_json:
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        for k, v in summary.items():
+            print(f'{k}: {v}')